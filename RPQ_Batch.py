@@ -0,0 +1,77 @@
+import numpy as np
+
+
+# Batch evaluation of many query times (NumPy)
+# Vectorized counterpart of RetroactiveEngine.size_at/min_at/max_at/is_bridge:
+# every query time is answered from sorted event arrays with searchsorted, and
+# min/max come from one sweep that "paints" the plot_data intervals onto the
+# elementary time slots.
+
+def evaluate_times(times, plot_data):
+    times = np.asarray(times, dtype=float)
+    added, keys, deleted = plot_columns(plot_data)
+
+    # Queue size: insertions so far minus deletions so far
+    ends = np.sort(deleted[np.isfinite(deleted)])
+    size = np.searchsorted(np.sort(added), times, side="right") - np.searchsorted(ends, times, side="right")
+
+    # Bridges: no item alive at the query time is deleted later, i.e. as many
+    # of the deleted items were added by then as were deleted by then
+    out = np.sort(added[np.isfinite(deleted)])
+    bridge = np.searchsorted(out, times, side="right") == np.searchsorted(ends, times, side="right")
+
+    # Min/max over the intervals covering each query time
+    slots = np.unique(np.concatenate([added, ends]))
+    lo = np.searchsorted(slots, added)
+    hi = np.searchsorted(slots, deleted)
+    slot = np.searchsorted(slots, times, side="right") - 1
+    low = _paint(lo, hi, keys, len(slots), np.minimum, np.inf)
+    high = _paint(lo, hi, keys, len(slots), np.maximum, -np.inf)
+    inside = slot >= 0
+    minimum = np.full(len(times), np.nan)
+    maximum = np.full(len(times), np.nan)
+    minimum[inside] = low[slot[inside]]
+    maximum[inside] = high[slot[inside]]
+    minimum[size == 0] = np.nan
+    maximum[size == 0] = np.nan
+
+    return {"time": times, "size": size, "min": minimum, "max": maximum, "bridge": bridge}
+
+
+def plot_columns(plot_data):
+    # (added, keys, deleted) float arrays, deleted inf while still in the queue.
+    # Columnar PlotStore arrays are read in place; lists of tuples are copied
+    if hasattr(plot_data, "columns"):
+        added, keys, deleted = (np.frombuffer(column, dtype=np.int64) for column in plot_data.columns)
+        deleted = np.where(deleted == np.iinfo(np.int64).min, np.inf, deleted)
+        return added.astype(float), keys.astype(float), deleted
+    n = len(plot_data)
+    added = np.fromiter((item[0] for item in plot_data), dtype=float, count=n)
+    keys = np.fromiter((item[1] for item in plot_data), dtype=float, count=n)
+    deleted = np.fromiter((np.inf if item[2] is None else item[2] for item in plot_data), dtype=float, count=n)
+    return added, keys, deleted
+
+
+def _paint(lo, hi, keys, slots, reduce, fill):
+    # Per-slot reduce() of the keys whose slot range [lo, hi) covers the slot.
+    # Like a sparse table in reverse: each range is written as two
+    # overlapping power-of-two blocks, then the blocks are pushed down level
+    # by level until they are single slots.
+    row = np.full(slots, fill)
+    if slots == 0:
+        return row
+    length = hi - lo
+    keep = length > 0
+    lo, hi, keys, length = lo[keep], hi[keep], keys[keep], length[keep]
+    level_of = np.frexp(length)[1] - 1  # floor(log2(length))
+    levels = int(slots).bit_length()
+    for level in range(levels - 1, -1, -1):
+        if level < levels - 1:
+            half = 1 << level
+            below = row.copy()
+            below[half:] = reduce(below[half:], row[:-half])
+            row = below
+        at = level_of == level
+        reduce.at(row, lo[at], keys[at])
+        reduce.at(row, hi[at] - (1 << level), keys[at])
+    return row
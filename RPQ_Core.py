@@ -0,0 +1,1471 @@
+import bisect
+import functools
+import heapq
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+# AVL Tree (for retroactive PQ)
+# Ordered by (key, timestamp) so repeated keys stay distinct; iterative, with
+# subtree sizes for rank and k-th queries.
+
+class Node:
+    __slots__ = ("key", "timestamp", "left", "right", "height", "size")
+
+    def __init__(self, key, timestamp):
+        self.key = key
+        self.timestamp = timestamp
+        self.left = None
+        self.right = None
+        self.height = 1  # Track the height for balancing
+        self.size = 1    # Nodes in this subtree
+
+class AVLTree:
+    def __init__(self):
+        self.root = None
+
+    def __len__(self):
+        return self.root.size if self.root else 0
+
+    def build(self, items):
+        # Balanced tree from (key, timestamp) pairs already in order, in O(n)
+        self.root = self._build(items, 0, len(items))
+
+    def _build(self, items, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        node = Node(*items[mid])
+        node.left = self._build(items, lo, mid)
+        node.right = self._build(items, mid + 1, hi)
+        self._update(node)
+        return node
+
+    def insert(self, key, timestamp):
+        item = (key, timestamp)
+        path = []
+        node = self.root
+        while node is not None:
+            went_left = item < (node.key, node.timestamp)
+            path.append((node, went_left))
+            node = node.left if went_left else node.right
+        self._retrace(path, Node(key, timestamp))
+
+    def delete(self, key, timestamp=None):
+        # Without a timestamp the earliest node with this key goes
+        if timestamp is None:
+            node = self._lower_bound(key)
+            if node is None or node.key != key:
+                return
+            timestamp = node.timestamp
+        item = (key, timestamp)
+        path = []
+        node = self.root
+        while node is not None and item != (node.key, node.timestamp):
+            went_left = item < (node.key, node.timestamp)
+            path.append((node, went_left))
+            node = node.left if went_left else node.right
+        if node is None:
+            return
+        if node.left and node.right:
+            # Replace by the in-order successor, then unlink the successor
+            path.append((node, False))
+            temp = node.right
+            while temp.left is not None:
+                path.append((temp, True))
+                temp = temp.left
+            node.key = temp.key
+            node.timestamp = temp.timestamp
+            node = temp
+        self._retrace(path, node.left or node.right)
+
+    def _retrace(self, path, child):
+        # Hang child back under the search path and rebalance bottom-up
+        for node, went_left in reversed(path):
+            if went_left:
+                node.left = child
+            else:
+                node.right = child
+            child = self._balance(node)
+        self.root = child
+
+    def _lower_bound(self, key):
+        # First node in order whose key is >= key
+        found = None
+        node = self.root
+        while node is not None:
+            if node.key >= key:
+                found = node
+                node = node.left
+            else:
+                node = node.right
+        return found
+
+    def min(self):
+        return self._get_min_value_node(self.root) if self.root else None
+
+    def max(self):
+        return self._get_max_value_node(self.root) if self.root else None
+
+    def rank(self, key, timestamp):
+        # Number of nodes ordered before (key, timestamp)
+        item = (key, timestamp)
+        count = 0
+        node = self.root
+        while node is not None:
+            if (node.key, node.timestamp) < item:
+                count += self._get_size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def kth(self, k):
+        # Node at 0-based position k in order, None when out of range
+        node = self.root
+        while node is not None:
+            left = self._get_size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node
+            else:
+                k -= left + 1
+                node = node.right
+        return None
+
+    def _get_min_value_node(self, node):
+        current = node
+        while current.left is not None:
+            current = current.left
+        return current
+
+    def _get_max_value_node(self, node):
+        current = node
+        while current.right is not None:
+            current = current.right
+        return current
+
+    def _get_height(self, node):
+        return node.height if node else 0
+
+    def _get_size(self, node):
+        return node.size if node else 0
+
+    def _get_balance(self, node):
+        return self._get_height(node.left) - self._get_height(node.right) if node else 0
+
+    def _update(self, node):
+        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
+
+    def _rotate_left(self, z):
+        y = z.right
+        T2 = y.left
+        y.left = z
+        z.right = T2
+        self._update(z)
+        self._update(y)
+        return y
+
+    def _rotate_right(self, z):
+        y = z.left
+        T3 = y.right
+        y.right = z
+        z.left = T3
+        self._update(z)
+        self._update(y)
+        return y
+
+    def _balance(self, node):
+        self._update(node)
+        balance = self._get_balance(node)
+        if balance > 1:
+            if self._get_balance(node.left) < 0:
+                node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        if balance < -1:
+            if self._get_balance(node.right) > 0:
+                node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
+        return node
+
+    def inorder_traversal(self, current, result):
+        stack = []
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            result.append((current.key, current.timestamp))
+            current = current.right
+        return result
+
+
+# Augmented Tree Node (for Augmented BBST view)
+# Leaves have no children. They only hold keys: the insertion itself is a
+# row of the event store, its deletion time a row of plot_data (see
+# RetroactiveEngine.update_event and deletion_time).
+
+NO_AUG = float('-inf')  # Augmented value of a subtree without deleted keys
+
+
+class AugTreeNode:
+    __slots__ = ("left", "right", "aug", "key", "prio", "active", "top", "low", "lo", "hi", "height", "size")
+
+    def __init__(self, key=None):
+        self.left = None
+        self.right = None
+        self.aug = NO_AUG     # Augmented value
+        # Engine bookkeeping (see AugTree)
+        self.key = key        # (timestamp, seq) of the insertion
+        self.prio = None      # (key, timestamp, seq): delete-min order
+        self.active = False   # Leaf is still in Q_now
+        self.top = None       # Leaf with the largest deleted key in the subtree
+        self.low = None       # Leaf with the smallest Q_now key in the subtree
+        self.lo = self.hi = None
+        self.height = 1
+        self.size = 1         # Leaves in the subtree
+
+
+# Update Tree Node (for the Updates BBST view)
+
+class UpdateNode:
+    __slots__ = ("left", "right", "val", "sum", "key", "minpre", "lo", "hi", "height")
+
+    def __init__(self, key=None):
+        self.left = None
+        self.right = None
+        self.val = 0      # Update value
+        self.sum = 0      # Subtree sum
+        # Engine bookkeeping (see UpdateTree)
+        self.key = key    # (timestamp, seq) of the update
+        self.minpre = 0   # Smallest prefix sum inside the subtree
+        self.lo = self.hi = None
+        self.height = 1
+
+
+# Leaf-oriented AVL trees (for the retroactive engine)
+# Updates live in the leaves ordered by (timestamp, seq); internal nodes only
+# route and carry the subtree aggregates, just like the Augmented/Updates views.
+
+class LeafTree:
+    def __init__(self):
+        self.root = None
+
+    def _new_node(self):
+        raise NotImplementedError
+
+    def _pull(self, node):
+        raise NotImplementedError
+
+    def build(self, leaves):
+        # Balanced tree over leaves already sorted by key, in O(n)
+        self.root = self._build(leaves, 0, len(leaves))
+
+    def _build(self, leaves, lo, hi):
+        if lo >= hi:
+            return None
+        if hi - lo == 1:
+            self._pull(leaves[lo])
+            return leaves[lo]
+        mid = (lo + hi) // 2
+        node = self._new_node()
+        node.left = self._build(leaves, lo, mid)
+        node.right = self._build(leaves, mid, hi)
+        self._pull(node)
+        return node
+
+    def insert(self, leaf):
+        self._pull(leaf)
+        self.root = self._insert(self.root, leaf)
+
+    def _insert(self, node, leaf):
+        if node is None:
+            return leaf
+        if node.left is None:
+            parent = self._new_node()
+            if leaf.key < node.key:
+                parent.left, parent.right = leaf, node
+            else:
+                parent.left, parent.right = node, leaf
+            self._pull(parent)
+            return parent
+        if leaf.key <= node.left.hi:
+            node.left = self._insert(node.left, leaf)
+        else:
+            node.right = self._insert(node.right, leaf)
+        return self._balance(node)
+
+    def remove(self, key):
+        self.root = self._remove(self.root, key)
+
+    def _remove(self, node, key):
+        if node.left is None:
+            return None
+        if key <= node.left.hi:
+            node.left = self._remove(node.left, key)
+        else:
+            node.right = self._remove(node.right, key)
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        return self._balance(node)
+
+    def find(self, key):
+        # Leaf with this key, None if there is none
+        node = self.root
+        while node is not None and node.left is not None:
+            node = node.left if key <= node.left.hi else node.right
+        return node if node is not None and node.key == key else None
+
+    def repair(self, key):
+        # A leaf changed in place: recompute the aggregates on its root path only
+        path = []
+        node = self.root
+        while node.left is not None:
+            path.append(node)
+            node = node.left if key <= node.left.hi else node.right
+        self._pull(node)
+        for node in reversed(path):
+            self._pull(node)
+
+    def _rotate_left(self, z):
+        y = z.right
+        z.right = y.left
+        y.left = z
+        self._pull(z)
+        self._pull(y)
+        return y
+
+    def _rotate_right(self, z):
+        y = z.left
+        z.left = y.right
+        y.right = z
+        self._pull(z)
+        self._pull(y)
+        return y
+
+    def _balance(self, node):
+        self._pull(node)
+        balance = node.left.height - node.right.height
+        if balance > 1:
+            if node.left.left.height < node.left.right.height:
+                node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        if balance < -1:
+            if node.right.right.height < node.right.left.height:
+                node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
+        return node
+
+
+class UpdateTree(LeafTree):
+    # Prefix sums of the update values: time t is a bridge when the sum up to
+    # t is the lowest one so far (see RetroactiveEngine.is_bridge)
+
+    def _new_node(self):
+        return UpdateNode()
+
+    def _pull(self, node):
+        if node.left is None:
+            node.sum = node.minpre = node.val
+            node.lo = node.hi = node.key
+            node.height = 1
+            return
+        left, right = node.left, node.right
+        node.sum = left.sum + right.sum
+        node.minpre = min(left.minpre, left.sum + right.minpre)
+        node.lo, node.hi = left.lo, right.hi
+        node.height = 1 + max(left.height, right.height)
+
+    def prefix(self, key):
+        # Sum of the update values strictly before key
+        total = 0
+        node = self.root
+        while node is not None:
+            if node.left is None:
+                return total + (node.val if node.key < key else 0)
+            if key <= node.left.hi:
+                node = node.left
+            else:
+                total += node.left.sum
+                node = node.right
+        return total
+
+    def prefix_min(self, key):
+        # (sum of the update values strictly before key, smallest prefix sum
+        # up to there, the empty prefix 0 included)
+        total = low = 0
+        node = self.root
+        while node is not None:
+            if node.left is None:
+                if node.key < key:
+                    total += node.val
+                    low = min(low, total)
+                return total, low
+            if key <= node.left.hi:
+                node = node.left
+            else:
+                low = min(low, total + node.left.minpre)
+                total += node.left.sum
+                node = node.right
+        return total, low
+
+    def last_zero(self, key, offset):
+        # Latest leaf before key whose prefix sum (plus offset) is 0
+        return self._last_zero(self.root, offset, key)
+
+    def _last_zero(self, node, offset, key):
+        if node is None or node.lo >= key or offset + node.minpre > 0:
+            return None
+        if node.left is None:
+            return node
+        found = self._last_zero(node.right, offset + node.left.sum, key)
+        if found is None:
+            found = self._last_zero(node.left, offset, key)
+        return found
+
+    def first_zero(self, key, offset):
+        # Earliest leaf at or after key whose prefix sum (plus offset) is 0
+        return self._first_zero(self.root, offset, key)
+
+    def _first_zero(self, node, offset, key):
+        if node is None or node.hi < key or offset + node.minpre > 0:
+            return None
+        if node.left is None:
+            return node
+        found = self._first_zero(node.left, offset, key)
+        if found is None:
+            found = self._first_zero(node.right, offset + node.left.sum, key)
+        return found
+
+
+class AugTree(LeafTree):
+    # Insertions only: max deleted key (aug) and min Q_now key per subtree,
+    # and leaf counts: the rank of a leaf is its row in plot_data
+
+    def _new_node(self):
+        return AugTreeNode()
+
+    def _pull(self, node):
+        if node.left is None:
+            node.top = None if node.active else node
+            node.low = node if node.active else None
+            node.lo = node.hi = node.key
+            node.height = node.size = 1
+        else:
+            left, right = node.left, node.right
+            node.top = _pick(left.top, right.top, max)
+            node.low = _pick(left.low, right.low, min)
+            node.lo, node.hi = left.lo, right.hi
+            node.height = 1 + max(left.height, right.height)
+            node.size = left.size + right.size
+        node.aug = node.top.prio[0] if node.top is not None else NO_AUG
+
+    def rank(self, key):
+        # Leaves before key
+        count = 0
+        node = self.root
+        while node is not None and node.left is not None:
+            if key <= node.left.hi:
+                node = node.left
+            else:
+                count += node.left.size
+                node = node.right
+        return count + (node is not None and node.key < key)
+
+    def max_after(self, key):
+        # Deleted insertion with the largest key among those after key
+        return self._max_after(self.root, key)
+
+    def _max_after(self, node, key):
+        if node is None or node.top is None or node.hi <= key:
+            return None
+        if node.lo > key:
+            return node.top
+        return _pick(self._max_after(node.left, key), self._max_after(node.right, key), max)
+
+    def min_upto(self, key):
+        # Q_now insertion with the smallest key among those at or before key
+        return self._min_upto(self.root, key)
+
+    def _min_upto(self, node, key):
+        if node is None or node.low is None or node.lo > key:
+            return None
+        if node.hi <= key:
+            return node.low
+        return _pick(self._min_upto(node.left, key), self._min_upto(node.right, key), min)
+
+
+def _pick(a, b, better):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return better(a, b, key=lambda leaf: leaf.prio)
+
+
+# Columnar stores (for the event log and plot_data)
+# One typed array per field instead of a tuple per row; indexing and iterating
+# still give the usual tuples, built on the fly.
+
+OPS = ("add", "delete-min", "query")
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+NONE = -2 ** 63  # Stands for None in int64 columns
+INT64_MAX = 2 ** 63 - 1
+
+
+def check_event(timestamp, event_type, value=None):
+    # Times and keys are stored in int64 columns, where NONE stands for
+    # None: ValueError for what they cannot hold, before anything is stored
+    if event_type not in OP_CODES:
+        raise ValueError(f"unknown event type {event_type!r}")
+    if event_type == "add" and value is None:
+        raise ValueError(f"add without a key at time {timestamp}")
+    for name, x in (("time", timestamp), ("key", value)):
+        if x is not None and not NONE < x <= INT64_MAX:
+            raise ValueError(f"{name} {x} is out of range (-2**63, 2**63)")
+
+
+class ColumnStore:
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("store index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        return (self._row(i) for i in range(len(self)))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def truncate(self, count):
+        for column in self.columns:
+            del column[count:]
+
+
+class _EventChunk:
+    # Packed columns of up to 2 * EventStore.CHUNK consecutive events
+    __slots__ = ("times", "seqs", "ops", "values")
+
+    def __init__(self):
+        self.times = array("q")
+        self.seqs = array("q")
+        self.ops = array("b")
+        self.values = array("q")
+
+    def row(self, o):
+        value = self.values[o]
+        return (self.times[o], OPS[self.ops[o]], None if value == NONE else value)
+
+    def key(self, o):
+        return (self.times[o], self.seqs[o])
+
+    def find(self, timestamp, seq):
+        o = bisect.bisect_left(self.times, timestamp)
+        while o < len(self.times) and self.times[o] == timestamp and self.seqs[o] < seq:
+            o += 1
+        return o
+
+    def insert(self, o, timestamp, seq, op, value):
+        self.times.insert(o, timestamp)
+        self.seqs.insert(o, seq)
+        self.ops.insert(o, op)
+        self.values.insert(o, NONE if value is None else value)
+
+    def delete(self, o):
+        del self.times[o], self.seqs[o], self.ops[o], self.values[o]
+
+
+class EventStore(ColumnStore):
+    # (timestamp, type, value) sorted by (timestamp, seq); seq breaks ties by arrival.
+    # A sorted container: the rows live in chunks of packed columns, a chunk
+    # is found by bisecting the chunks' first keys, and a Fenwick tree over
+    # the chunk sizes maps positions to chunks. insert, pop, find (rank) and
+    # indexing (select) are O(log n) plus a memmove inside one chunk.
+    OP_DELETE_MIN = OP_CODES["delete-min"]
+    CHUNK = 1024
+    COLUMNS = {"times": "q", "seqs": "q", "ops": "b", "values": "q"}
+
+    def __init__(self):
+        self.chunks = []     # _EventChunk, in key order, none empty
+        self.firsts = []     # (timestamp, seq) of the first row of each chunk
+        self._sizes = None   # Fenwick tree over the chunk sizes, rebuilt lazily
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            for o in range(len(chunk.times)):
+                yield chunk.row(o)
+
+    def keyed(self):
+        # ((timestamp, type, value), seq) in order, like RPQ_Log.EventLog.keyed()
+        for chunk in self.chunks:
+            for o in range(len(chunk.times)):
+                yield chunk.row(o), chunk.seqs[o]
+
+    def column(self, name):
+        # One contiguous copy of a column, e.g. for NumPy
+        out = array(self.COLUMNS[name])
+        for chunk in self.chunks:
+            out.extend(getattr(chunk, name))
+        return out
+
+    def _index(self):
+        if self._sizes is None:
+            tree = [0] * (len(self.chunks) + 1)
+            for c in range(1, len(tree)):
+                tree[c] += len(self.chunks[c - 1].times)
+                parent = c + (c & -c)
+                if parent < len(tree):
+                    tree[parent] += tree[c]
+            self._sizes = tree
+        return self._sizes
+
+    def _grow(self, c, delta):
+        if self._sizes is not None:
+            tree = self._sizes
+            c += 1
+            while c < len(tree):
+                tree[c] += delta
+                c += c & -c
+
+    def _before(self, c):
+        # Rows in the chunks before chunk c
+        tree = self._index()
+        total = 0
+        while c > 0:
+            total += tree[c]
+            c -= c & -c
+        return total
+
+    def _locate(self, i):
+        # (chunk, offset) of position i, by descending the Fenwick tree
+        tree = self._index()
+        c = 0
+        step = 1 << (len(tree) - 1).bit_length() >> 1
+        while step:
+            if c + step < len(tree) and tree[c + step] <= i:
+                c += step
+                i -= tree[c]
+            step >>= 1
+        return c, i
+
+    def _row(self, i):
+        c, o = self._locate(i)
+        return self.chunks[c].row(o)
+
+    def key(self, i):
+        c, o = self._locate(i)
+        return self.chunks[c].key(o)
+
+    def find(self, key):
+        # Position of the first entry whose (timestamp, seq) is >= key
+        if not self.chunks:
+            return 0
+        c = max(0, bisect.bisect_right(self.firsts, key) - 1)
+        return self._before(c) + self.chunks[c].find(*key)
+
+    def chunks_from(self, i):
+        # (position of the chunk's first row, chunk) from the chunk holding i on
+        if i >= self._len:
+            return
+        c, o = self._locate(i)
+        base = i - o
+        for chunk in self.chunks[c:]:
+            yield base, chunk
+            base += len(chunk.times)
+
+    def insert(self, timestamp, seq, event_type, value):
+        key = (timestamp, seq)
+        if not self.chunks:
+            self.chunks.append(_EventChunk())
+            self.firsts.append(key)
+            self._sizes = None
+        c = max(0, bisect.bisect_right(self.firsts, key) - 1)
+        chunk = self.chunks[c]
+        o = chunk.find(timestamp, seq)
+        index = self._before(c) + o
+        chunk.insert(o, timestamp, seq, OP_CODES[event_type], value)
+        if o == 0:
+            self.firsts[c] = key
+        self._grow(c, 1)
+        self._len += 1
+        if len(chunk.times) > 2 * self.CHUNK:
+            # Split in halves
+            half = _EventChunk()
+            for name in self.COLUMNS:
+                column = getattr(chunk, name)
+                getattr(half, name).extend(column[self.CHUNK:])
+                del column[self.CHUNK:]
+            self.chunks.insert(c + 1, half)
+            self.firsts.insert(c + 1, half.key(0))
+            self._sizes = None
+        return index
+
+    def append(self, timestamp, seq, event_type, value):
+        # Bulk loading, rows arrive already sorted
+        if not self.chunks or len(self.chunks[-1].times) >= self.CHUNK:
+            self.chunks.append(_EventChunk())
+            self.firsts.append((timestamp, seq))
+        chunk = self.chunks[-1]
+        chunk.insert(len(chunk.times), timestamp, seq, OP_CODES[event_type], value)
+        self._sizes = None
+        self._len += 1
+
+    def pop(self, i):
+        if i < 0:
+            i += self._len
+        c, o = self._locate(i)
+        chunk = self.chunks[c]
+        row = chunk.row(o)
+        chunk.delete(o)
+        self._len -= 1
+        if not chunk.times:
+            del self.chunks[c], self.firsts[c]
+            self._sizes = None
+        else:
+            if o == 0:
+                self.firsts[c] = chunk.key(0)
+            self._grow(c, -1)
+        return row
+
+
+class PlotStore(ColumnStore):
+    # (time_added, key, time_deleted) in insertion order
+    def __init__(self):
+        self.added = array("q")
+        self.keys = array("q")
+        self.deleted = array("q")
+        self.columns = (self.added, self.keys, self.deleted)
+
+    def _row(self, i):
+        deleted = self.deleted[i]
+        return (self.added[i], self.keys[i], None if deleted == NONE else deleted)
+
+    def append(self, time_added, key):
+        self.added.append(time_added)
+        self.keys.append(key)
+        self.deleted.append(NONE)
+
+
+# Timeline index (for time-travel queries)
+# Static segment tree over the elementary time slots of the plot_data
+# intervals: an item is in Q(t) for time_added <= t < time_deleted.
+
+class TimelineIndex:
+    def __init__(self, plot_data):
+        self.times = sorted({t for item in plot_data for t in (item[0], item[2]) if t is not None})
+        self.starts = sorted(item[0] for item in plot_data)
+        self.ends = sorted(item[2] for item in plot_data if item[2] is not None)
+        size = 1
+        while size < len(self.times):
+            size *= 2
+        self.size = size
+        self.items = [None] * (2 * size)  # (time_added, key) covering the node
+        self.low = [float('inf')] * (2 * size)
+        self.high = [float('-inf')] * (2 * size)
+        for t_added, key, t_deleted in plot_data:
+            l = bisect.bisect_left(self.times, t_added) + size
+            r = (len(self.times) if t_deleted is None else bisect.bisect_left(self.times, t_deleted)) + size
+            while l < r:
+                if l & 1:
+                    self._add(l, t_added, key)
+                    l += 1
+                if r & 1:
+                    r -= 1
+                    self._add(r, t_added, key)
+                l >>= 1
+                r >>= 1
+
+    def _add(self, node, t_added, key):
+        if self.items[node] is None:
+            self.items[node] = []
+        self.items[node].append((t_added, key))
+        self.low[node] = min(self.low[node], key)
+        self.high[node] = max(self.high[node], key)
+
+    def _path(self, t):
+        # Nodes from the leaf holding time t up to the root
+        i = bisect.bisect_right(self.times, t) - 1
+        if i < 0:
+            return
+        node = i + self.size
+        while node:
+            yield node
+            node >>= 1
+
+    def queue_at(self, t):
+        found = []
+        for node in self._path(t):
+            if self.items[node]:
+                found.extend(self.items[node])
+        found.sort()
+        return found
+
+    def min_at(self, t):
+        low = min((self.low[node] for node in self._path(t)), default=float('inf'))
+        return None if low == float('inf') else low
+
+    def max_at(self, t):
+        high = max((self.high[node] for node in self._path(t)), default=float('-inf'))
+        return None if high == float('-inf') else high
+
+    def size_at(self, t):
+        return bisect.bisect_right(self.starts, t) - bisect.bisect_right(self.ends, t)
+
+
+# Query cache: LRU of time-travel results (min, max, size at time t)
+# Q(t) only depends on the updates at times <= t, so an update at time t
+# only drops the entries at times >= t. Bridge flags are not cached: they
+# compare Q(t) with Q_now, which a later update can change.
+
+class QueryCache:
+    def __init__(self, size=4096):
+        self.size = size
+        self.entries = OrderedDict()  # (t, kind) -> result, least recently used first
+        self.keys = []                # Sorted keys of entries
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, kind, t, compute):
+        key = (t, kind)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = compute(t)
+        bisect.insort(self.keys, key)
+        if len(self.entries) > self.size:
+            old, _ = self.entries.popitem(last=False)
+            del self.keys[bisect.bisect_left(self.keys, old)]
+        return value
+
+    def put(self, kind, t, value):
+        if (t, kind) not in self.entries:
+            self.get(kind, t, lambda t: value)
+            self.misses -= 1
+
+    def invalidate_from(self, t):
+        i = bisect.bisect_left(self.keys, (t,))
+        for key in self.keys[i:]:
+            del self.entries[key]
+        del self.keys[i:]
+
+    def clear(self):
+        self.entries.clear()
+        self.keys = []
+
+
+# Per-phase timers and counters
+# Off by default: a decorated call then only tests one flag. Times are wall
+# clock and inclusive (the "tree" phase contains the "replay" it triggers).
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()  # Phases are recorded by the replay worker thread too
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.total = {}    # Seconds per phase
+            self.last = {}     # Seconds of the latest call per phase
+            self.counters = {}
+
+    def phase(self, name):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.total[name] = self.total.get(name, 0.0) + seconds
+            self.last[name] = seconds
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def stats(self):
+        # {phase: {"calls", "total_ms", "mean_ms", "last_ms"}}
+        with self.lock:
+            return {name: {"calls": calls,
+                           "total_ms": self.total[name] * 1000,
+                           "mean_ms": self.total[name] * 1000 / calls,
+                           "last_ms": self.last[name] * 1000}
+                    for name, calls in self.calls.items()}
+
+    def summary(self):
+        # Latest call of each phase, e.g. "replay 12 ms, tree 3 ms, plot 40 ms"
+        with self.lock:
+            return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.last.items())
+
+    def report(self):
+        lines = [f"{'phase':<12}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'last ms':>10}"]
+        for name, row in self.stats().items():
+            lines.append(f"{name:<12}{row['calls']:>8}{row['total_ms']:>12.1f}{row['mean_ms']:>10.2f}{row['last_ms']:>10.2f}")
+        with self.lock:
+            lines.extend(f"{name:<12}{value:>8}" for name, value in self.counters.items())
+        return "\n".join(lines)
+
+
+PROFILER = Profiler()
+
+
+# Retroactive engine (headless)
+# Keeps Q_now up to date under retroactive Insert/Delete of updates in O(log n)
+# using bridges: a time t is a bridge when every item alive at t is in Q_now.
+# Delete-mins on an empty queue consume a "phantom" +inf item; self._phantoms
+# counts them so the bridge arithmetic of the updates stays exact (queries
+# ask about the real queue instead, see is_bridge).
+
+_COMMAND = re.compile(r'Insert\(([^,]+),([^)]+)\)')
+
+
+def parse_commands(text):
+    # 'Insert(0, 1), Insert(4, "delete-min")' -> [(0, "add", 1), (4, "delete-min", None)],
+    # plus (time, action, reason) for every command that was rejected
+    commands = []
+    errors = []
+    for time_str, action_str in _COMMAND.findall(text):
+        action = action_str.strip().strip('"').strip("'")
+        try:
+            cmd_time = int(time_str.strip())
+            if action.lower() in ("delete-min", "query"):
+                command = (cmd_time, action.lower(), None)
+            else:
+                command = (cmd_time, "add", int(action))
+        except ValueError:
+            errors.append((time_str.strip(), action, "not an integer"))
+            continue
+        try:
+            check_event(*command)
+        except ValueError as exc:
+            errors.append((time_str.strip(), action, str(exc)))
+            continue
+        commands.append(command)
+    return commands, errors
+
+
+class ReplayCancelled(Exception):
+    # Raised by the replay when RetroactiveEngine.interrupt() asks it to stop
+    pass
+
+
+_START = (float('-inf'), -1)  # Bridge before every update
+SCAN_BUDGET = 32  # Full plot_data scans worth one TimelineIndex build
+
+
+def _merge_sorted(items, p, new):
+    # items[p:] (sorted) with the few items of new put in place: one bisect
+    # per new item and slice copies, not a sort of the whole queue
+    new.sort()
+    out = []
+    for item in new:
+        q = bisect.bisect_left(items, item, p)
+        out += items[p:q]
+        out.append(item)
+        p = q
+    out += items[p:]
+    return out
+
+
+class RetroactiveEngine:
+    def __init__(self, checkpoint_stride=1024, checkpoint_budget=1 << 20, query_cache_size=4096):
+        # plot_data replays are resumed from a checkpoint taken every
+        # checkpoint_stride updates; the checkpoints hold at most
+        # checkpoint_budget queue items in total, the oldest go first
+        self.checkpoint_stride = checkpoint_stride
+        self.checkpoint_budget = checkpoint_budget
+        self.query_cache = QueryCache(query_cache_size)  # min_at/max_at/size_at results
+        self.journal = None      # When a list, every insert/remove is recorded in it
+        self.plot_version = 0    # Bumped whenever plot_data may have changed
+        self.version = 0         # Bumped by every update (and load)
+        self.interrupt = None    # Callable polled by the replay, True cancels it
+        self.load_events([])
+
+    @PROFILER.phase("load")
+    def load_events(self, events):
+        # Bulk (re)build. Sources with keyed() (EventStore, RPQ_Log.EventLog)
+        # stream their rows in key order and keep their (timestamp, seq)
+        # keys, so journals stay valid.
+        if hasattr(events, "keyed"):
+            keyed = events.keyed()
+        else:
+            keyed = [(event, seq) for seq, event in enumerate(sorted(events, key=lambda x: x[0]))]
+        self._load_keyed(keyed)
+
+    def _load_keyed(self, keyed):
+        # keyed: ((timestamp, type, value), seq) sorted by (timestamp, seq),
+        # any iterable.
+        # One replay decides which insertions are in Q_now, then every tree
+        # is built bottom-up instead of going through insert_event. The rows
+        # are checked while they are read, before the engine's state is
+        # replaced, so a bad row (ValueError) leaves it as it was.
+        events = EventStore()
+        update_leaves = []
+        aug_leaves = []
+        add_leaves = []          # Updates BBST leaf of each insertion
+        deletes = 0
+        next_seq = 0
+        for (timestamp, event_type, value), seq in keyed:
+            check_event(timestamp, event_type, value)
+            key = (timestamp, seq)
+            events.append(timestamp, seq, event_type, value)
+            update_leaf = UpdateNode(key)
+            if event_type == "add":
+                aug_leaf = AugTreeNode(key)
+                aug_leaf.prio = (value, timestamp, seq)
+                aug_leaves.append(aug_leaf)
+                add_leaves.append(update_leaf)
+            elif event_type == "delete-min":
+                update_leaf.val = -1
+                deletes += 1
+            update_leaves.append(update_leaf)
+            next_seq = max(next_seq, seq + 1)
+        self.events = events     # (timestamp, type, value), sorted by time
+        self._seq = next_seq
+        self._phantoms = 0
+        self.queue = []          # Active insertions: (timestamp, value), sorted by time
+        self.queue_index = {}    # (timestamp, value) -> count, hashed view of queue
+        self.bst = AVLTree()     # Q_now ordered by key
+        self.update_tree = UpdateTree()
+        self.aug_tree = AugTree()
+        self._plot_data = PlotStore()
+        self.plot_version += 1
+        self.version += 1
+        self._dirty = None       # Earliest (timestamp, seq) changed since the last replay
+        self._checkpoints = []   # (key, adds before key, sorted queue before key), sorted by key
+        self._checkpoint_items = 0
+        self._timeline = None    # TimelineIndex over plot_data, built on demand
+        self._timeline_until = None  # Earliest update time changed since it was built
+        self._scanned = 0        # plot_data rows scanned by point queries since the last change
+        self.query_cache.clear()
+        if not len(self.events):
+            return
+        self._dirty = _START
+        deleted = self.plot_data.deleted
+        for aug_leaf, update_leaf, t_deleted in zip(aug_leaves, add_leaves, deleted):
+            if t_deleted == NONE:
+                aug_leaf.active = True
+                item = (aug_leaf.key[0], aug_leaf.prio[0])
+                self.queue.append(item)
+                self.queue_index[item] = self.queue_index.get(item, 0) + 1
+            else:
+                update_leaf.val = 1
+        self._phantoms = deletes - (len(deleted) - len(self.queue))
+        self.queue.sort()
+        self.bst.build(sorted((value, timestamp) for timestamp, value in self.queue))
+        self.update_tree.build(update_leaves)
+        self.aug_tree.build(aug_leaves)
+
+    @property
+    def plot_data(self):
+        # (time_added, key, time_deleted) history, replayed only when asked for
+        if self._dirty is not None:
+            self._plot_data = self._replay()
+            self._dirty = None
+            self.plot_version += 1
+        return self._plot_data
+
+    def needs_replay(self):
+        # Reading plot_data would replay part of the history
+        return self._dirty is not None
+
+    def _invalidate(self, key):
+        self.version += 1
+        if self._dirty is None or key < self._dirty:
+            self._dirty = key
+        # The index still answers Q(t) for t before the change, like the cache
+        if self._timeline_until is None or key[0] < self._timeline_until:
+            self._timeline_until = key[0]
+        self._scanned = 0
+        self.query_cache.invalidate_from(key[0])
+
+    def _timeline_valid(self, t):
+        return self._timeline is not None and (self._timeline_until is None or t < self._timeline_until)
+
+    def _timeline_index(self):
+        # Rebuilt from scratch: one update can move O(n) deletion times
+        self._timeline = TimelineIndex(self.plot_data)
+        self._timeline_until = None
+        return self._timeline
+
+    # Time-travel queries: the queue as it was after every update at time <= t
+
+    def queue_at(self, t):
+        # Q(t) as (timestamp, value) pairs sorted by time
+        return (self._timeline if self._timeline_valid(t) else self._timeline_index()).queue_at(t)
+
+    # min/max/size go through the query cache, so past times survive edits later on
+    def min_at(self, t):
+        return self.query_cache.get("min", t, lambda t: self._point_query("min", t))
+
+    def max_at(self, t):
+        return self.query_cache.get("max", t, lambda t: self._point_query("max", t))
+
+    def size_at(self, t):
+        return self.query_cache.get("size", t, lambda t: self._point_query("size", t))
+
+    def _point_query(self, kind, t):
+        # Right after a change, a few queries are cheaper as a scan of the
+        # plot_data rows added up to t than as a new TimelineIndex; the index
+        # is built once the scans have cost about as much as building it
+        if self._timeline_valid(t):
+            return getattr(self._timeline, kind + "_at")(t)
+        if self._scanned >= SCAN_BUDGET * (len(self.plot_data) + 1):
+            return getattr(self._timeline_index(), kind + "_at")(t)
+        added, keys, deleted = self.plot_data.columns
+        n = bisect.bisect_right(added, t)
+        self._scanned += n
+        alive = [keys[i] for i in range(n) if deleted[i] == NONE or deleted[i] > t]
+        results = {"size": len(alive), "min": min(alive, default=None), "max": max(alive, default=None)}
+        for other, value in results.items():
+            if other != kind:
+                self.query_cache.put(other, t, value)
+        return results[kind]
+
+    def evaluate_times(self, times):
+        # NumPy batch version of size_at/min_at/max_at/is_bridge (see RPQ_Batch)
+        from RPQ_Batch import evaluate_times
+        return evaluate_times(times, self.plot_data)
+
+    @PROFILER.phase("replay")
+    def _replay(self):
+        # Nothing before the earliest change can differ: resume from the last
+        # checkpoint before it and drop the checkpoints after it.
+        # A checkpoint keeps the queue it saw as (key, timestamp, seq, row)
+        # sorted, and the replay pops from it through a cursor next to a
+        # heap of the insertions since, instead of copying it. Its items go
+        # smallest first, so those deleted after it are a prefix of the
+        # list: a resume only clears that prefix and rewrites the rows added
+        # since, O(updates since the checkpoint) rather than O(|Q_now|).
+        while self._checkpoints and self._checkpoints[-1][0] > self._dirty:
+            self._checkpoint_items -= len(self._checkpoints.pop()[2])
+        events = self.events
+        if self._checkpoints:
+            last, count, items = self._checkpoints[-1]
+            plot_data = self._plot_data
+            plot_data.truncate(count)
+            deleted = plot_data.deleted
+            for item in items:
+                if deleted[item[3]] == NONE:
+                    break
+                deleted[item[3]] = NONE
+            start = events.find(last)
+            PROFILER.count("resumed")
+        else:
+            last, count, items = None, 0, []
+            plot_data = PlotStore()
+            start = 0
+        heap = []
+        p = 0
+        rows = count
+        add, delete_min = OP_CODES["add"], OP_CODES["delete-min"]
+        deleted = plot_data.deleted
+        stride = self.checkpoint_stride
+        for base, chunk in events.chunks_from(start):
+            times, seqs, ops, values = chunk.times, chunk.seqs, chunk.ops, chunk.values
+            for j in range(max(0, start - base), len(times)):
+                if (base + j) % stride == 0:
+                    if self.interrupt is not None and self.interrupt():
+                        # Checkpoints so far are valid and _dirty is still set
+                        raise ReplayCancelled
+                    key = (times[j], seqs[j])
+                    if last is None or key > last:
+                        items = _merge_sorted(items, p, heap)
+                        heap = []
+                        p = 0
+                        self._save_checkpoint(key, rows, items)
+                op = ops[j]
+                if op == add:
+                    heapq.heappush(heap, (values[j], times[j], seqs[j], rows))
+                    plot_data.append(times[j], values[j])
+                    rows += 1
+                elif op == delete_min:
+                    if p < len(items) and (not heap or items[p] < heap[0]):
+                        deleted[items[p][3]] = times[j]
+                        p += 1
+                    elif heap:
+                        deleted[heapq.heappop(heap)[3]] = times[j]
+        PROFILER.count("replayed", len(events) - start)
+        return plot_data
+
+    def _save_checkpoint(self, key, count, items):
+        self._checkpoints.append((key, count, items))
+        self._checkpoint_items += len(items)
+        while self._checkpoint_items > self.checkpoint_budget and len(self._checkpoints) > 1:
+            self._checkpoint_items -= len(self._checkpoints.pop(0)[2])
+
+    def find_events(self, timestamp, event_type):
+        events = self.events
+        i = events.find((timestamp, float('-inf')))
+        found = []
+        while i < len(events):
+            row = events[i]
+            if row[0] != timestamp:
+                break
+            if row[1] == event_type:
+                found.append(i)
+            i += 1
+        return found
+
+    def replace_event(self, timestamp, event_type, value=None):
+        # Substitution used by prompt mode: an update replaces the one of the
+        # same type at the same time
+        check_event(timestamp, event_type, value)
+        for index in reversed(self.find_events(timestamp, event_type)):
+            self.remove_event(index)
+        return self.insert_event(timestamp, event_type, value)
+
+    @PROFILER.phase("ingest")
+    def ingest(self, commands):
+        # Batched replace_event: commands are (timestamp, type, value) in input
+        # order. Only the last command per (timestamp, type) survives, exactly
+        # as if they were replaced one by one in timestamp order.
+        for command in commands:
+            check_event(*command)
+        batch = {}
+        for timestamp, event_type, value in sorted(commands, key=lambda x: x[0]):
+            batch.pop((timestamp, event_type), None)
+            batch[(timestamp, event_type)] = value
+        if self.journal is not None or len(batch) * 4 < len(self.events):
+            # Small batch: cheaper to patch the trees in place
+            for (timestamp, event_type), value in batch.items():
+                self.replace_event(timestamp, event_type, value)
+            return len(batch)
+        # Large batch: merge into the surviving events and rebuild once
+        kept = [(event, seq) for event, seq in self.events.keyed() if (event[0], event[1]) not in batch]
+        self._merge_load(kept, [(timestamp, event_type, value) for (timestamp, event_type), value in batch.items()])
+        return len(batch)
+
+    def insert_events(self, events):
+        # Batched insert_event for (timestamp, type, value) in arrival order
+        events = list(events)
+        for event in events:
+            check_event(*event)
+        if self.journal is not None or len(events) * 4 < len(self.events):
+            for event in events:
+                self.insert_event(*event)
+        else:
+            self._merge_load(list(self.events.keyed()), events)
+        return len(events)
+
+    def _merge_load(self, kept, events):
+        # Rebuild from keyed events plus new ones, which get the next seqs in
+        # arrival order, as if inserted one by one
+        new = sorted(((event, self._seq + i) for i, event in enumerate(events)), key=lambda x: x[0][0])
+        self._load_keyed(list(heapq.merge(kept, new, key=lambda x: (x[0][0], x[1]))))
+
+    def insert_event(self, timestamp, event_type, value=None, seq=None):
+        # seq is only given to put back an event that was removed (undo/redo)
+        check_event(timestamp, event_type, value)
+        if seq is None:
+            seq = self._seq
+        self._seq = max(self._seq, seq + 1)
+        key = (timestamp, seq)
+        update_leaf = UpdateNode(key)
+        if event_type == "add":
+            aug_leaf = AugTreeNode(key)
+            aug_leaf.prio = (value, timestamp, seq)
+            # Q_now gains max(k, largest key deleted after the last bridge)
+            bridge = self._last_bridge(key)
+            if bridge is None:
+                self._phantoms -= 1
+            else:
+                winner = self.aug_tree.max_after(bridge)
+                if winner is not None and winner.prio > aug_leaf.prio:
+                    self._set_active(winner, True)
+                else:
+                    aug_leaf.active = True
+                    self._enter_queue(aug_leaf)
+            update_leaf.val = 0 if aug_leaf.active else 1
+            self.aug_tree.insert(aug_leaf)
+        elif event_type == "delete-min":
+            # Q_now loses its smallest key inserted before the next bridge
+            self._remove_min_upto(self._first_bridge(key))
+            update_leaf.val = -1
+        self.update_tree.insert(update_leaf)
+        index = self.events.insert(timestamp, seq, event_type, value)
+        if self.journal is not None:
+            self.journal.append(("insert", key, (timestamp, event_type, value)))
+        self._invalidate(key)
+        return index
+
+    def apply_journal(self, entry, undo):
+        # Replay one journaled update, or its inverse when undoing
+        action, key, event = entry
+        if (action == "insert") != undo:
+            self.insert_event(*event, seq=key[1])
+        else:
+            self.remove_event(self.events.find(key))
+
+    def remove_event(self, index):
+        key = self.events.key(index)
+        event = self.events.pop(index)
+        event_type = event[1]
+        if self.journal is not None:
+            self.journal.append(("remove", key, event))
+        if event_type == "add":
+            aug_leaf = self.aug_tree.find(key)
+            if aug_leaf.active:
+                self._leave_queue(aug_leaf)
+            else:
+                # Whoever deleted it takes the next smallest key instead
+                self._remove_min_upto(self.update_tree.first_zero(key, self._phantoms).key)
+            self.aug_tree.remove(key)
+        elif event_type == "delete-min":
+            # Q_now gets back the largest key deleted after the last bridge
+            bridge = self._last_bridge(key)
+            if bridge is None:
+                self._phantoms -= 1
+            else:
+                self._set_active(self.aug_tree.max_after(bridge), True)
+        self.update_tree.remove(key)
+        self._invalidate(key)
+
+    def _last_bridge(self, key):
+        leaf = self.update_tree.last_zero(key, self._phantoms)
+        if leaf is not None:
+            return leaf.key
+        return _START if self._phantoms == 0 else None
+
+    def _first_bridge(self, key):
+        if self._phantoms + self.update_tree.prefix(key) == 0:
+            return key
+        return self.update_tree.first_zero(key, self._phantoms).key
+
+    def _remove_min_upto(self, key):
+        loser = self.aug_tree.min_upto(key)
+        if loser is None:
+            self._phantoms += 1
+        else:
+            self._set_active(loser, False)
+
+    def _set_active(self, aug_leaf, active):
+        aug_leaf.active = active
+        self.aug_tree.repair(aug_leaf.key)
+        self.update_tree.find(aug_leaf.key).val = 0 if active else 1
+        self.update_tree.repair(aug_leaf.key)
+        if active:
+            self._enter_queue(aug_leaf)
+        else:
+            self._leave_queue(aug_leaf)
+
+    def _enter_queue(self, aug_leaf):
+        item = (aug_leaf.key[0], aug_leaf.prio[0])
+        bisect.insort(self.queue, item)
+        self.queue_index[item] = self.queue_index.get(item, 0) + 1
+        self.bst.insert(item[1], item[0])
+
+    def _leave_queue(self, aug_leaf):
+        item = (aug_leaf.key[0], aug_leaf.prio[0])
+        del self.queue[bisect.bisect_left(self.queue, item)]
+        if self.queue_index[item] == 1:
+            del self.queue_index[item]
+        else:
+            self.queue_index[item] -= 1
+        self.bst.delete(item[1], item[0])
+
+    def in_queue(self, items):
+        # Bulk membership of (timestamp, value) insertions in Q_now
+        index = self.queue_index
+        return [item in index for item in items]
+
+    def get_update_value(self, event):
+        timestamp, etype, val = event
+        if etype == "add":
+            if (timestamp, val) in self.queue_index:
+                return 0
+            else:
+                return 1
+        elif etype == "delete-min":
+            return -1
+        else:
+            # For any other event type (like "query"), return 0.
+            return 0
+
+    @PROFILER.phase("aug tree")
+    def build_augmented_tree(self):
+        # The engine keeps the Augmented BBST up to date; the leaves'
+        # deletion times come from plot_data (see deletion_time), replayed
+        # here if the history changed
+        self.plot_data
+        return self.aug_tree.root
+
+    def update_event(self, update_leaf):
+        # (timestamp, type, value) of an Updates BBST leaf, from the event store
+        return self.events[self.events.find(update_leaf.key)]
+
+    def deletion_time(self, aug_leaf):
+        # Of an Augmented BBST leaf, None while in Q_now: the insertions are
+        # the rows of plot_data in the same order, read when a leaf is drawn
+        return self.plot_data[self.aug_tree.rank(aug_leaf.key)][2]
+
+    @PROFILER.phase("update tree")
+    def build_update_tree(self):
+        # The engine keeps the Updates BBST up to date, nothing to rebuild
+        return self.update_tree.root
+
+    def is_bridge(self, query_time):
+        # Bridge: every item alive at query_time is in Q_now. The prefix sum
+        # of the update values is the number of items alive but not in Q_now,
+        # less the delete-mins so far that found the queue empty. Those are
+        # the ones taking the sum to a new low, so query_time is a bridge when
+        # the sum up to it is the lowest so far.
+        total, low = self.update_tree.prefix_min((query_time, float('inf')))
+        return total == low
+
+    def latest_bridge(self, query_time):
+        # Latest bridge <= query_time, reported at the time it starts;
+        # None when only the empty start of the timeline qualifies
+        if self.is_bridge(query_time):
+            return query_time
+        key = (query_time, float('inf'))
+        while True:
+            # Latest update before key where the prefix sum is the lowest
+            leaf = self.update_tree.last_zero(key, -self.update_tree.prefix_min(key)[1])
+            if leaf is None:
+                return None
+            if self.is_bridge(leaf.key[0]):
+                return leaf.key[0]
+            # Zero in the middle of simultaneous updates: skip that time
+            key = (leaf.key[0], -1)
+
+    def max_key(self):
+        node = self.bst.max()
+        return node.key if node else 0
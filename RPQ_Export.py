@@ -0,0 +1,354 @@
+import argparse
+import bisect
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import RPQ_Vis
+from RPQ_TreeView import GAP, TreeView, collapse_depth
+
+# Headless rendering of the key-time plot and the tree views to image files
+# (.png, .svg, .pdf: what matplotlib writes) with the Agg backend, no Tk.
+# The plot is RetroactivePriorityQueue.update_plot on an off-screen canvas;
+# the trees are drawn by RPQ_TreeView.TreeView on RecordingCanvas, which
+# stands in for the tk.Canvas and hands the items to matplotlib. Every
+# process keeps one Renderer (figures and artists are reused), so
+# histories and animation frames can be rendered by a pool of workers.
+
+VIEWS = ("plot", "PQ", "Augmented", "Updates")
+LEGEND = 24  # Pixels under a tree for its legend
+MAX_TREE_PX = 8192  # Widest tree image; deeper levels are collapsed beyond it
+
+
+class RecordingCanvas:
+    # The part of the tk.Canvas API that TreeView uses. The items are kept
+    # here and render() turns them into a few artists of a matplotlib axes,
+    # reused from one image to the next: edges (Tk puts them under the
+    # nodes), shapes, and a pool of labels.
+    def __init__(self, ax, width, height):
+        from matplotlib.collections import LineCollection, PolyCollection
+        self.items = {}      # id -> [kind, coords, options, tags], in stacking order
+        self.next_id = 1
+        self.ax = ax
+        self.dpi = ax.figure.dpi
+        ax.set_axis_off()
+        self.resize(width, height)
+        line_width = 72 / self.dpi  # Tk draws 1 pixel wide outlines and lines
+        self.edges = ax.add_collection(LineCollection([], linewidths=line_width, zorder=1))
+        self.shapes = ax.add_collection(PolyCollection([], linewidths=line_width, zorder=2))
+        self.labels = []     # Text artists, the unused ones hidden
+        angles = RPQ_Vis.np.linspace(0, 2 * RPQ_Vis.np.pi, 33)
+        self.circle = RPQ_Vis.np.column_stack([RPQ_Vis.np.cos(angles), RPQ_Vis.np.sin(angles)]) / 2
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self.ax.set_xlim(0, width)   # Canvas pixels are axes units,
+        self.ax.set_ylim(height, 0)  # y pointing down like in Tk
+
+    def bind(self, sequence, callback):
+        pass
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def _create(self, kind, coords, options):
+        item = self.next_id
+        self.next_id += 1
+        tags = options.pop("tags", ())
+        self.items[item] = [kind, list(coords), options, tags]
+        return item
+
+    def create_oval(self, *coords, **options):
+        return self._create("oval", coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self._create("rect", coords, options)
+
+    def create_polygon(self, *coords, **options):
+        return self._create("polygon", coords, options)
+
+    def create_line(self, *coords, **options):
+        return self._create("line", coords, options)
+
+    def create_text(self, x, y, **options):
+        return self._create("text", (x, y), options)
+
+    def coords(self, item, *coords):
+        self.items[item][1] = list(coords)
+
+    def itemconfig(self, item, **options):
+        self.items[item][2].update(options)
+
+    def delete(self, item):
+        if isinstance(item, str):
+            self.items = {key: value for key, value in self.items.items() if item not in value[3]}
+        else:
+            self.items.pop(item, None)
+
+    def tag_lower(self, tag):
+        lowered = {key: value for key, value in self.items.items() if tag in value[3]}
+        lowered.update(self.items)
+        self.items = lowered
+
+    def render(self):
+        edges, edge_colors = [], []
+        shapes, fills, outlines = [], [], []
+        texts = []
+        for kind, coords, options, _ in self.items.values():
+            if kind == "line":
+                edges.append(list(zip(coords[0::2], coords[1::2])))
+                edge_colors.append(options.get("fill", "black"))
+            elif kind == "text":
+                texts.append((coords, options))
+            elif kind == "polygon":
+                shapes.append(list(zip(coords[0::2], coords[1::2])))
+                fills.append(options.get("fill", "black"))
+                outlines.append(options.get("outline") or "none")
+            else:
+                x0, y0, x1, y1 = coords
+                if kind == "oval":
+                    shapes.append(self.circle * (x1 - x0, y1 - y0) + ((x0 + x1) / 2, (y0 + y1) / 2))
+                else:
+                    shapes.append([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+                fills.append(options.get("fill") or "none")
+                outlines.append(options.get("outline", "black"))
+        self.edges.set_segments(edges)
+        self.edges.set_colors(edge_colors)
+        self.shapes.set_verts(shapes)
+        self.shapes.set_facecolors(fills)
+        self.shapes.set_edgecolors(outlines)
+        while len(self.labels) < len(texts):
+            self.labels.append(self.ax.text(0, 0, "", ha="center", va="center", multialignment="center", zorder=3))
+        for label, ((x, y), options) in zip(self.labels, texts):
+            font = options.get("font")
+            label.set(x=x, y=y, text=options.get("text", ""), color=options.get("fill", "black"), visible=True,
+                      fontsize=(font[1] if font else 9) * 96 / self.dpi)
+        for label in self.labels[len(texts):]:
+            label.set_visible(False)
+
+
+class _Queue(RPQ_Vis.RetroactivePriorityQueue):
+    limits = None  # Plot axes of every frame when set, see Renderer.pin_limits
+
+    def _plot_limits(self, added, keys, deleted):
+        return self.limits or super()._plot_limits(added, keys, deleted)
+
+
+class Renderer:
+    def __init__(self, width=1200, height=400, dpi=100):
+        RPQ_Vis.load_plot_modules()
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        size = (width / dpi, height / dpi)
+        rpq = self.rpq = _Queue(None)
+        rpq.figure = Figure(figsize=size, dpi=dpi)
+        rpq.ax = rpq.figure.add_subplot()
+        rpq.canvas_plot = FigureCanvasAgg(rpq.figure)
+        rpq.init_plot()
+        self.size = (width, height)
+        self.tree_figure = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(self.tree_figure)
+        self.tree_ax = self.tree_figure.add_axes([0, 0, 1, 1])
+        self.tree_legend = self.tree_figure.text(0, 0, "", fontsize=8, va="center")
+        self.tree_canvas = RecordingCanvas(self.tree_ax, width, height - LEGEND)
+        self.tree_view = TreeView(self.tree_canvas)
+        self._resize_tree(width, height)
+
+    def load(self, events):
+        # A whole history (any RetroactiveEngine.load_events source), shown
+        # at the time step after its last update, like the GUI after Load Log
+        rpq = self.rpq
+        rpq.load_events(events)
+        rpq.time = rpq.events[-1][0] + 1 if rpq.events else 0
+        self._query_lines()
+
+    def advance(self, events):
+        # Updates at the present, one at a time like the GUI steps: a frame
+        # then shows the same trees whatever the frames before it were
+        rpq = self.rpq
+        for timestamp, event_type, value in events:
+            rpq.insert_event(timestamp, event_type, value)
+            rpq.time = max(rpq.time, timestamp + 1)
+        self._query_lines()
+
+    def pin_limits(self):
+        # The axes of the current (complete) history for every later frame,
+        # so that an animation does not jump between scales
+        rpq = self.rpq
+        rpq.limits = None
+        rpq.plot_limits = None
+        added, keys, deleted = RPQ_Vis.plot_columns(rpq.plot_data)
+        rpq.limits = rpq._plot_limits(added, keys, deleted[RPQ_Vis.np.isfinite(deleted)])
+
+    def _query_lines(self):
+        rpq = self.rpq
+        max_key = rpq.max_key()
+        rpq.query_lines = [(t, max_key, rpq.is_bridge(t)) for t, event_type, _ in rpq.events if event_type == "query"]
+
+    def save(self, view, path):
+        if view == "plot":
+            self.save_plot(path)
+        else:
+            self.save_tree(view, path)
+
+    def save_plot(self, path):
+        rpq = self.rpq
+        rpq.update_plot()
+        if path.lower().endswith(".png"):
+            # The canvas already holds the frame, blitted layers included
+            _save_png(path, rpq.canvas_plot)
+            return
+        # savefig leaves animated artists out: draw them as static ones
+        artists = [artist for layer in rpq.plot_artists.values() for artist in layer]
+        for artist in artists:
+            artist.set_animated(False)
+        try:
+            rpq.figure.savefig(path)
+        finally:
+            for artist in artists:
+                artist.set_animated(True)
+            rpq.plot_backgrounds = None  # Next update_plot draws everything again
+
+    def _resize_tree(self, width, height):
+        self.tree_figure.set_size_inches(width / self.tree_figure.dpi, height / self.tree_figure.dpi)
+        self.tree_ax.set_position([0, LEGEND / height, 1, 1 - LEGEND / height])
+        self.tree_legend.set_position((8 / width, LEGEND / 2 / height))
+        self.tree_canvas.resize(width, height - LEGEND)
+
+    def save_tree(self, view, path):
+        # At zoom 1, where every label is readable: the image grows with the
+        # tree (never below the requested size) up to MAX_TREE_PX, and the
+        # levels that would not fit are collapsed into glyphs with their sizes
+        rpq = self.rpq
+        root, style = rpq.tree_root(view), rpq.tree_styles[view]
+        max_depth = collapse_depth(root, MAX_TREE_PX // (style["width"] + GAP))
+        self.tree_view.show(root, style, rpq.version, max_depth)
+        width, height = self.tree_view.extent()
+        self._resize_tree(max(self.size[0], min(MAX_TREE_PX, math.ceil(width))),
+                          max(self.size[1], min(MAX_TREE_PX, math.ceil(height) + LEGEND)))
+        self.tree_view.fit(whole=True)
+        self.tree_canvas.render()
+        self.tree_legend.set_text(RPQ_Vis.TREE_LEGENDS[view])
+        if path.lower().endswith(".png"):
+            self.tree_figure.canvas.draw()
+            _save_png(path, self.tree_figure.canvas)
+        else:
+            self.tree_figure.savefig(path)
+
+
+def _save_png(path, canvas):
+    # What the Agg canvas holds, with fast compression: zlib's default level
+    # takes twice as long for files about a fifth smaller
+    from matplotlib.image import imsave
+    imsave(path, RPQ_Vis.np.asarray(canvas.buffer_rgba()), pil_kwargs={"compress_level": 1})
+
+
+_renderer = None  # Renderer of this process
+_events = None    # History of render_frames, sent once per worker
+
+
+def _init(size, events=None):
+    global _renderer, _events
+    _renderer = Renderer(*size)
+    _events = events
+    if events is not None:
+        _renderer.load(events)
+        _renderer.pin_limits()
+
+
+def _render_history(job):
+    events, outputs = job
+    _renderer.load(events)
+    for view, path in outputs:
+        _renderer.save(view, path)
+    return [path for _, path in outputs]
+
+
+def _render_frames(job):
+    # A run of consecutive frames: from an empty queue, only the updates
+    # since the previous frame are added for each frame
+    frames, pattern, views = job
+    times = [event[0] for event in _events]
+    written = []
+    done = 0
+    _renderer.load(())
+    for frame, t in frames:
+        end = bisect.bisect_right(times, t)
+        _renderer.advance(_events[done:end])
+        done = end
+        for view in views:
+            path = pattern.format(frame=frame, time=t, view=view)
+            _renderer.save(view, path)
+            written.append(path)
+    return written
+
+
+def _run(fn, jobs, workers, initargs):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        global _renderer, _events
+        _init(*initargs)
+        try:
+            return [path for job in jobs for path in fn(job)]
+        finally:
+            _renderer = _events = None
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=initargs) as pool:
+        return [path for paths in pool.map(fn, jobs) for path in paths]
+
+
+def render_histories(histories, pattern, views=VIEWS, workers=None, size=(1200, 400, 100)):
+    # One image per history and view; pattern is formatted with {index} and
+    # {view}, e.g. "out/{index:04d}_{view}.png". size: (width, height, dpi)
+    jobs = [(list(events), [(view, pattern.format(index=i, view=view)) for view in views])
+            for i, events in enumerate(histories)]
+    return _run(_render_history, jobs, workers, (size,))
+
+
+def render_frames(events, pattern, views=("plot",), step=1, workers=None, size=(1200, 400, 100)):
+    # An animation of one history: frame k shows the updates up to the k-th
+    # distinct time (every step-th), like the GUI after each time step.
+    # pattern is formatted with {frame}, {time} and {view}. Each worker gets
+    # runs of consecutive frames and only adds the new updates between two.
+    events = sorted(events, key=lambda event: event[0])
+    times = sorted({event[0] for event in events})
+    frames = list(enumerate(times[step - 1::step] if step > 1 else times))
+    workers = workers or os.cpu_count() or 1
+    runs = max(1, min(len(frames), 4 * workers))
+    jobs = [(frames[len(frames) * i // runs:len(frames) * (i + 1) // runs], pattern, tuple(views))
+            for i in range(runs)]
+    return _run(_render_frames, [job for job in jobs if job[0]], workers, (size, events))
+
+
+if __name__ == "__main__":
+    # python RPQ_Export.py LOG OUTDIR: images of a saved history (see RPQ_Log)
+    parser = argparse.ArgumentParser(description="Render a history to image files without the GUI")
+    parser.add_argument("log", help="event log (.txt for the text form)")
+    parser.add_argument("outdir")
+    parser.add_argument("--views", default=",".join(VIEWS))
+    parser.add_argument("--format", default="png", help="png, svg, pdf, ...")
+    parser.add_argument("--frames", type=int, metavar="STEP", help="one frame every STEP time steps")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--size", default="1200x400", help="WIDTHxHEIGHT in pixels")
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+    import RPQ_Log
+    if args.log.endswith(".txt"):
+        history = list(RPQ_Log.read_text(args.log))
+    else:
+        with RPQ_Log.EventLog(args.log) as log:
+            history = [event for event, _ in log.keyed()]
+    os.makedirs(args.outdir, exist_ok=True)
+    width, height = (int(x) for x in args.size.split("x"))
+    views = args.views.split(",")
+    if args.frames:
+        pattern = os.path.join(args.outdir, "{view}_{frame:05d}." + args.format)
+        paths = render_frames(history, pattern, views, args.frames, args.workers, (width, height, args.dpi))
+    else:
+        pattern = os.path.join(args.outdir, "{view}." + args.format)
+        paths = render_histories([history], pattern, views, args.workers, (width, height, args.dpi))
+    print(f"{len(paths)} files written to {args.outdir}", file=sys.stderr)
@@ -0,0 +1,225 @@
+import heapq
+import mmap
+from array import array
+import os
+import struct
+import sys
+
+from RPQ_Core import NONE, OPS, OP_CODES
+
+
+# Event log files
+# Binary: a 32-byte header, then fixed-width 32-byte records of four
+# little-endian int64 (timestamp, seq, op, value), value NONE for
+# delete-min/query. Records are only ever appended.
+# Text: one "timestamp type [value]" line per event, "#" starts a comment.
+
+MAGIC = b"RPQLOG\x00\x01"
+HEADER = struct.Struct("<8sqqq")  # magic, record size, flags, next seq
+RECORD = struct.Struct("<qqqq")
+SORTED = 1  # Flag: records are in (timestamp, seq) order
+RUN = 1 << 16  # Records per sorted run when ordering an unsorted log without NumPy
+
+
+class LogWriter:
+    # Append-only writer. While it is open the header says "unsorted", so a
+    # log left by a crash is still read correctly; close() writes the real flags.
+    def __init__(self, path, append=True):
+        exists = append and os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self.file = open(path, "r+b" if exists else "w+b")
+        self.last = None
+        if exists:
+            self.flags, self.next_seq = _read_header(self.file.read(HEADER.size))
+            # Drop a partial record left by an interrupted write
+            count = (os.fstat(self.file.fileno()).st_size - HEADER.size) // RECORD.size
+            self.file.truncate(HEADER.size + count * RECORD.size)
+            if count:
+                self.file.seek(HEADER.size + (count - 1) * RECORD.size)
+                self.last = RECORD.unpack(self.file.read(RECORD.size))[:2]
+        else:
+            self.flags, self.next_seq = SORTED, 0
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, RECORD.size, 0, self.next_seq))
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, timestamp, event_type, value=None, seq=None):
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = max(self.next_seq, seq + 1)
+        if self.last is not None and (timestamp, seq) < self.last:
+            self.flags &= ~SORTED
+        self.last = (timestamp, seq)
+        self.file.write(RECORD.pack(timestamp, seq, OP_CODES[event_type], NONE if value is None else value))
+        return seq
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, RECORD.size, self.flags, self.next_seq))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventLog:
+    # Read-only binary log mapped in memory. The fields are strided int64
+    # views into the mapping (no copy), and records are decoded one at a
+    # time, so a history never has to exist as a list of Python tuples.
+    # The views assume a little-endian host, like the file.
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.flags, self.next_seq = _read_header(self.map[:HEADER.size])
+        count = (len(self.map) - HEADER.size) // RECORD.size
+        self.records = memoryview(self.map)[HEADER.size:HEADER.size + count * RECORD.size].cast("q")
+        self.times = self.records[0::4]
+        self.seqs = self.records[1::4]
+        self.ops = self.records[2::4]
+        self.values = self.records[3::4]
+
+    def __len__(self):
+        return len(self.times)
+
+    def event(self, i):
+        value = self.values[i]
+        return (self.times[i], OPS[self.ops[i]], None if value == NONE else value)
+
+    def __iter__(self):
+        # File order, which is insertion order for an unsorted log
+        for i in range(len(self)):
+            yield self.event(i)
+
+    def order(self):
+        # Record indices in (timestamp, seq) order, without a key tuple per
+        # record: NumPy argsorts the mapped columns into an int64 array;
+        # otherwise runs of RUN records are sorted on their own and merged
+        if self.flags & SORTED:
+            return range(len(self))
+        try:
+            import numpy as np
+        except ImportError:
+            return self._merge_order()
+        times, seqs = np.asarray(self.times), np.asarray(self.seqs)
+        indices = array("q")
+        indices.frombytes(np.lexsort((seqs, times)).astype(np.int64).tobytes())
+        del times, seqs  # Views into the mapping: close() needs them gone
+        return indices
+
+    def _merge_order(self):
+        times, seqs = self.times, self.seqs
+        key = lambda i: (times[i], seqs[i])
+        runs = [array("q", sorted(range(start, min(start + RUN, len(self))), key=key))
+                for start in range(0, len(self), RUN)]
+        return heapq.merge(*runs, key=key)
+
+    def keyed(self):
+        # ((timestamp, type, value), seq) in key order, for RetroactiveEngine.load_events
+        for i in self.order():
+            yield self.event(i), self.seqs[i]
+
+    def replay(self):
+        # Streaming replay in time order with a heap, no engine needed:
+        # yields (timestamp, type, value, result), where result is the key a
+        # delete-min removed or the minimum seen by a query (None if empty)
+        heap = []
+        for i in self.order():
+            timestamp, event_type, value = self.event(i)
+            result = None
+            if event_type == "add":
+                heapq.heappush(heap, value)
+            elif event_type == "delete-min":
+                result = heapq.heappop(heap) if heap else None
+            elif heap:
+                result = heap[0]
+            yield timestamp, event_type, value, result
+
+    def close(self):
+        for view in (self.times, self.seqs, self.ops, self.values, self.records):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_header(data):
+    if len(data) < HEADER.size:
+        raise ValueError("not an event log: file too short")
+    magic, record_size, flags, next_seq = HEADER.unpack(data)
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError("not an event log: bad header")
+    return flags, next_seq
+
+
+def _keyed(events):
+    if hasattr(events, "keyed"):
+        return events.keyed()
+    return ((event, seq) for seq, event in enumerate(events))
+
+
+def write_log(path, events):
+    # events: an EventStore (keeps its seqs), an EventLog or (timestamp, type, value) tuples
+    with LogWriter(path, append=False) as writer:
+        for (timestamp, event_type, value), seq in _keyed(events):
+            writer.append(timestamp, event_type, value, seq)
+
+
+def write_text(path, events):
+    with open(path, "w") as f:
+        for timestamp, event_type, value in events:
+            f.write(f"{timestamp} {event_type}\n" if value is None else f"{timestamp} {event_type} {value}\n")
+
+
+def read_text(path):
+    # Generator of (timestamp, type, value), one line at a time
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            try:
+                if fields[1] == "add" and len(fields) == 3:
+                    yield int(fields[0]), "add", int(fields[2])
+                elif fields[1] in ("delete-min", "query") and len(fields) == 2:
+                    yield int(fields[0]), fields[1], None
+                else:
+                    raise ValueError
+            except (ValueError, IndexError):
+                raise ValueError(f"{path}:{line_no}: bad event line: {line.strip()!r}") from None
+
+
+def load(engine, path):
+    # Text files by extension, everything else is a binary log
+    if path.endswith(".txt"):
+        engine.load_events(read_text(path))
+    else:
+        with EventLog(path) as log:
+            engine.load_events(log)
+
+
+def save(events, path):
+    if path.endswith(".txt"):
+        write_text(path, (event for event, _ in _keyed(events)))
+    else:
+        write_log(path, events)
+
+
+if __name__ == "__main__":
+    # python RPQ_Log.py SRC DST: convert between the text and binary forms
+    if len(sys.argv) != 3:
+        sys.exit("usage: python RPQ_Log.py SRC DST  (.txt is text, anything else binary)")
+    src, dst = sys.argv[1:]
+    if src.endswith(".txt"):
+        save(read_text(src), dst)
+    else:
+        with EventLog(src) as log:
+            save(log, dst)
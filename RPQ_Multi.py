@@ -0,0 +1,186 @@
+from array import array
+from collections import OrderedDict
+
+from RPQ_Core import NONE, OPS, OP_CODES, RetroactiveEngine, check_event
+
+
+# Many independent retroactive queues in one process (one per tenant or
+# scenario), driven by batches of (queue_id, time, op, value).
+# Only the most recently used queues are live RetroactiveEngines, with their
+# trees and plot_data. The others are parked as packed rows of one shared
+# store (25 bytes per event) and rebuilt in O(n) by _load_keyed when they
+# are touched again, so memory follows the number of events, not of queues.
+
+OPERATIONS = ("add", "delete-min", "query", "remove")  # remove: every update at that time
+
+
+class SharedEvents:
+    # Events of the parked queues, back to back in shared packed columns.
+    # A queue owns one contiguous run; runs that are taken back become
+    # garbage until compact() moves the live runs together.
+    def __init__(self):
+        self.times = array("q")
+        self.seqs = array("q")
+        self.ops = array("b")
+        self.values = array("q")
+        self.runs = {}       # queue_id -> (start, count)
+        self.garbage = 0     # Rows not in any run
+
+    def __len__(self):
+        return len(self.times) - self.garbage
+
+    def __contains__(self, queue_id):
+        return queue_id in self.runs
+
+    def put(self, queue_id, keyed):
+        # keyed: ((timestamp, type, value), seq) in key order
+        start = len(self.times)
+        for (timestamp, event_type, value), seq in keyed:
+            self.times.append(timestamp)
+            self.seqs.append(seq)
+            self.ops.append(OP_CODES[event_type])
+            self.values.append(NONE if value is None else value)
+        self.runs[queue_id] = (start, len(self.times) - start)
+
+    def keyed(self, queue_id):
+        start, count = self.runs[queue_id]
+        times, seqs, ops, values = self.times, self.seqs, self.ops, self.values
+        for i in range(start, start + count):
+            value = values[i]
+            yield (times[i], OPS[ops[i]], None if value == NONE else value), seqs[i]
+
+    def drop(self, queue_id):
+        self.garbage += self.runs.pop(queue_id)[1]
+        if self.garbage > 4096 and self.garbage > len(self):
+            self.compact()
+
+    def compact(self):
+        runs = {}
+        columns = (self.times, self.seqs, self.ops, self.values)
+        packed = [array(column.typecode) for column in columns]
+        for queue_id, (start, count) in self.runs.items():
+            runs[queue_id] = (len(packed[0]), count)
+            for out, column in zip(packed, columns):
+                out.extend(column[start:start + count])
+        self.times, self.seqs, self.ops, self.values = packed
+        self.runs = runs
+        self.garbage = 0
+
+
+class QueueManager:
+    def __init__(self, max_live=64):
+        # At least the queue being updated has to stay live
+        if max_live < 1:
+            raise ValueError(f"max_live must be at least 1, not {max_live}")
+        self.max_live = max_live
+        self.live = OrderedDict()    # queue_id -> RetroactiveEngine, least recently used first
+        self.parked = SharedEvents()
+
+    def __len__(self):
+        return len(self.live) + len(self.parked.runs)
+
+    def __contains__(self, queue_id):
+        return queue_id in self.live or queue_id in self.parked
+
+    def queue_ids(self):
+        return list(self.live) + list(self.parked.runs)
+
+    def engine(self, queue_id, events=()):
+        # The live engine of a queue, created or unparked on demand. events
+        # (timestamp, type, value) are inserted first; a queue that has to be
+        # rebuilt anyway takes them in the same rebuild.
+        engine = self.live.get(queue_id)
+        if engine is not None:
+            self.live.move_to_end(queue_id)
+            if events:
+                engine.insert_events(events)
+            return engine
+        engine = RetroactiveEngine()
+        parked = queue_id in self.parked
+        keyed = list(self.parked.keyed(queue_id)) if parked else []
+        if events:
+            engine._seq = max((seq + 1 for _, seq in keyed), default=0)
+            engine._merge_load(keyed, events)
+        elif keyed:
+            engine._load_keyed(keyed)
+        # Only now: a bad event (ValueError) leaves the queue parked
+        if parked:
+            self.parked.drop(queue_id)
+        self.live[queue_id] = engine
+        while len(self.live) > self.max_live:
+            self._park(next(iter(self.live)))
+        return engine
+
+    def _park(self, queue_id):
+        engine = self.live.pop(queue_id)
+        self.parked.put(queue_id, engine.events.keyed())
+
+    def drop(self, queue_id):
+        if self.live.pop(queue_id, None) is None and queue_id in self.parked:
+            self.parked.drop(queue_id)
+
+    def events(self, queue_id):
+        # Without unparking the queue
+        if queue_id in self.live:
+            return list(self.live[queue_id].events)
+        if queue_id in self.parked:
+            return [event for event, _ in self.parked.keyed(queue_id)]
+        return []
+
+    def apply(self, operations):
+        # Batched updates (queue_id, time, op, value), op from OPERATIONS.
+        # They are grouped per queue (in order within a queue) and runs of
+        # insertions go through insert_events, which rebuilds a queue once
+        # instead of patching its trees update by update for large runs.
+        groups = {}
+        for queue_id, timestamp, op, value in operations:
+            if op not in OPERATIONS:
+                raise ValueError(f"unknown operation {op!r} for queue {queue_id!r}")
+            if op == "add" and value is None:
+                raise ValueError(f"add without a key for queue {queue_id!r} at time {timestamp}")
+            # Every update is checked before the first one is applied
+            check_event(timestamp, "query" if op == "remove" else op, value if op == "add" else None)
+            groups.setdefault(queue_id, []).append((timestamp, op, None if op != "add" else value))
+        for queue_id, updates in groups.items():
+            pending = []
+            engine = None
+            for timestamp, op, value in updates:
+                if op != "remove":
+                    pending.append((timestamp, op, value))
+                    continue
+                if engine is None:
+                    engine = self.engine(queue_id, pending)
+                elif pending:
+                    engine.insert_events(pending)
+                pending = []
+                i = engine.events.find((timestamp, float('-inf')))
+                while i < len(engine.events) and engine.events[i][0] == timestamp:
+                    engine.remove_event(i)
+            if engine is None:
+                self.engine(queue_id, pending)
+            elif pending:
+                engine.insert_events(pending)
+        return len(groups)
+
+    def query(self, queries):
+        # Batched reads (queue_id, time) -> (size, min, max, bridge) of the
+        # queue as it was after the updates at time <= t, in input order.
+        # An unknown queue is empty (and is not created)
+        by_queue = {}
+        for n, (queue_id, t) in enumerate(queries):
+            by_queue.setdefault(queue_id, []).append((n, t))
+        results = [None] * len(queries)
+        for queue_id, wanted in by_queue.items():
+            if queue_id not in self:
+                for n, _ in wanted:
+                    results[n] = (0, None, None, True)
+                continue
+            engine = self.engine(queue_id)
+            for n, t in wanted:
+                results[n] = (engine.size_at(t), engine.min_at(t), engine.max_at(t), engine.is_bridge(t))
+        return results
+
+    def stats(self):
+        return {"queues": len(self), "live": len(self.live), "parked_events": len(self.parked),
+                "live_events": sum(len(engine.events) for engine in self.live.values()),
+                "garbage_rows": self.parked.garbage}
@@ -0,0 +1,161 @@
+import bisect
+import os
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import RPQ_Log
+from RPQ_Core import NONE, RetroactiveEngine
+
+
+# What-if runs of one base history over a process pool.
+# A variant is a list of retroactive edits:
+#   ("insert", t, type, value)   a new update at time t
+#   ("remove", t, type)          the first update of that type at t
+#   ("move", t, type, new_t)     the same, put back at new_t
+# The base history is shared as a binary event log (RPQ_Log) that every
+# worker maps in memory and loads once. Each variant is applied to that
+# engine with the journal on and undone afterwards, so only the history
+# after its earliest edit is replayed, never the whole of it.
+
+_base = None  # _Base of this process
+
+
+class _Base:
+    def __init__(self, path, queries):
+        self.engine = RetroactiveEngine()
+        with RPQ_Log.EventLog(path) as log:
+            self.engine.load_events(log)
+        self.columns = [array("q", column) for column in self.engine.plot_data.columns]
+        self.queries = queries
+
+    def run(self, variant):
+        engine = self.engine
+        engine.journal = []
+        try:
+            _apply(engine, variant)
+            removed, added = self._diff(engine.plot_data, _earliest(variant))
+            return {"queue": list(engine.queue), "removed": removed, "added": added,
+                    "queries": _answer(engine, self.queries)}
+        finally:
+            journal, engine.journal = engine.journal, None
+            for entry in reversed(journal):
+                engine.apply_journal(entry, undo=True)
+
+    def _diff(self, plot_data, since):
+        # (rows only in the base, rows only in the variant). Rows added
+        # before the earliest edit are at the same place in both, only their
+        # deletion time can differ; the rest is compared as a multiset.
+        if since is None:
+            return [], []
+        base_added, base_keys, base_deleted = self.columns
+        added, keys, deleted = plot_data.columns
+        p = bisect.bisect_left(base_added, since)
+        old, new = [], []
+        if base_deleted[:p] != deleted[:p]:
+            for i in range(p):
+                if base_deleted[i] != deleted[i]:
+                    old.append((base_added[i], base_keys[i], base_deleted[i]))
+                    new.append((added[i], keys[i], deleted[i]))
+        before = Counter(zip(base_added[p:], base_keys[p:], base_deleted[p:]))
+        after = Counter(zip(added[p:], keys[p:], deleted[p:]))
+        old.extend(sorted((before - after).elements()))
+        new.extend(sorted((after - before).elements()))
+        return [_row(row) for row in old], [_row(row) for row in new]
+
+
+def _row(row):
+    return row if row[2] != NONE else (row[0], row[1], None)
+
+
+def _earliest(variant):
+    # Earliest time a variant touches, None without edits
+    return min((t for edit in variant for t in ((edit[1], edit[3]) if edit[0] == "move" else (edit[1],))),
+               default=None)
+
+
+def _apply(engine, variant):
+    for edit in variant:
+        action, t = edit[0], edit[1]
+        if action == "insert":
+            engine.insert_event(t, edit[2], edit[3])
+        elif action in ("remove", "move"):
+            found = engine.find_events(t, edit[2])
+            if not found:
+                raise ValueError(f"{action}: no {edit[2]} at time {t}")
+            value = engine.events[found[0]][2]
+            engine.remove_event(found[0])
+            if action == "move":
+                engine.insert_event(edit[3], edit[2], value)
+        else:
+            raise ValueError(f"unknown scenario edit {action!r}")
+
+
+def _answer(engine, times):
+    # (size, min, max, bridge) at each query time, vectorized when NumPy is there
+    if not times:
+        return []
+    try:
+        columns = engine.evaluate_times(times)
+    except ImportError:
+        return [(engine.size_at(t), engine.min_at(t), engine.max_at(t), engine.is_bridge(t)) for t in times]
+    def key(x):
+        return None if x != x else int(x)
+    return [(int(size), key(low), key(high), bool(bridge))
+            for size, low, high, bridge in zip(columns["size"], columns["min"], columns["max"], columns["bridge"])]
+
+
+def _init(path, queries):
+    global _base
+    _base = _Base(path, queries)
+
+
+def _run(variant):
+    return _base.run(variant)
+
+
+def run_scenarios(base, variants, queries=None, workers=None):
+    # base: events (anything RPQ_Log.save takes) or the path of an event log.
+    # queries: times answered for every variant, by default the times of
+    # the base's query events. Returns, per variant in order, a dict with
+    # the final queue, the plot_data diff ("removed"/"added" rows) and the
+    # (size, min, max, bridge) query results. workers=1 runs in this process.
+    temp = None
+    if isinstance(base, str) and not base.endswith(".txt"):
+        path = base
+    else:
+        if isinstance(base, str):
+            base = RPQ_Log.read_text(base)
+        fd, temp = tempfile.mkstemp(suffix=".rpqlog")
+        os.close(fd)
+        RPQ_Log.write_log(temp, base)
+        path = temp
+    try:
+        if queries is None:
+            with RPQ_Log.EventLog(path) as log:
+                queries = sorted({t for t, event_type, _ in log if event_type == "query"})
+        # Latest edits first: undoing a variant leaves the history dirty
+        # from its earliest edit, which the next one then replays anyway
+        since = [_earliest(variant) for variant in variants]
+        order = sorted(range(len(variants)), key=lambda i: float('-inf') if since[i] is None else since[i], reverse=True)
+        ordered = [variants[i] for i in order]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(variants) < 2:
+            global _base
+            _init(path, queries)
+            try:
+                results = [_run(variant) for variant in ordered]
+            finally:
+                _base = None
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init, initargs=(path, queries)) as pool:
+                chunksize = max(1, len(variants) // (4 * workers))
+                results = list(pool.map(_run, ordered, chunksize=chunksize))
+        out = [None] * len(variants)
+        for i, result in zip(order, results):
+            out[i] = result
+        return out
+    finally:
+        if temp is not None:
+            os.remove(temp)
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+
+from RPQ_Multi import QueueManager
+
+# Asyncio service driving retroactive queues from other processes:
+# line-delimited JSON over localhost TCP or a Unix socket, one request per
+# line and one response per line, in request order, echoing its "id".
+#   {"op": "add", "value": 5}          at the present, or at "time": t (retroactive)
+#   {"op": "delete-min"}               same
+#   {"op": "query"}                    like the Query button: records a query, returns max and bridge
+#   {"op": "remove", "time": t}        retroactive Delete of the updates at t
+#   {"op": "edit", "time": t, "type": "add", "value": 7}   replaces the updates at t
+#   {"op": "at", "time": t}            time-travel query: size, min, max and bridge at t
+#   {"op": "stats"}
+# Every request may name a "queue" (default "default"). Requests can be
+# pipelined: the writes received in one event-loop tick are applied as one
+# QueueManager.apply batch, and the responses of a tick leave in one write
+# per connection. A connection stops being read while its responses are not
+# drained or too many of its requests wait (backpressure).
+
+WRITES = ("add", "delete-min", "remove", "edit")
+READS = ("query", "at", "stats")
+UPDATES = ("add", "delete-min", "query")
+MAX_PENDING = 4096   # Requests of one connection waiting for a tick
+MAX_LINE = 1 << 20
+LIMIT = 1 << 62      # Times and keys are stored as int64
+
+
+def parse_request(request):
+    # Decoded request -> (op, queue, time, type, value); ValueError if bad
+    op = request.get("op")
+    if op not in WRITES and op not in READS:
+        raise ValueError(f"unknown op {op!r}")
+    time, event_type, value = request.get("time"), request.get("type"), request.get("value")
+    if time is not None and not _integer(time) or (time is None and op in ("remove", "edit", "at")):
+        raise ValueError(f"{op}: time must be an integer")
+    if op == "edit" and event_type not in UPDATES:
+        raise ValueError(f"edit: type must be one of {', '.join(UPDATES)}")
+    if (op == "add" or op == "edit" and event_type == "add") and not _integer(value):
+        raise ValueError(f"{op}: value must be an integer")
+    return op, str(request.get("queue", "default")), time, event_type, value
+
+
+def _integer(x):
+    return isinstance(x, int) and not isinstance(x, bool) and -LIMIT <= x < LIMIT
+
+
+class Server:
+    def __init__(self, manager=None):
+        self.manager = manager if manager is not None else QueueManager()
+        self.clock = {}       # queue -> present time, after its latest update
+        self.pending = []     # (connection, id, op, queue, time, type, value, error)
+        self.scheduled = False
+
+    def submit(self, connection, line):
+        rid = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("not a JSON object")
+            rid = request.get("id")
+            item = (connection, rid) + parse_request(request) + (None,)
+        except ValueError as exc:
+            item = (connection, rid, "error", None, None, None, None, str(exc))
+        self.pending.append(item)
+        connection.waiting += 1
+        if not self.scheduled:
+            self.scheduled = True
+            asyncio.get_running_loop().call_soon(self.tick)
+
+    def _time(self, queue, time):
+        if time is None:
+            time = self.clock.get(queue, 0)
+        self.clock[queue] = max(self.clock.get(queue, 0), time + 1)
+        return time
+
+    def tick(self):
+        # Everything received since the last tick, in order; consecutive
+        # writes become one batch, a read first applies the writes before it
+        self.scheduled = False
+        pending, self.pending = self.pending, []
+        batch, acks = [], []
+        touched = set()
+        for connection, rid, op, queue, time, event_type, value, error in pending:
+            touched.add(connection)
+            if op == "error":
+                self._apply(batch, acks)
+                connection.reply({"id": rid, "error": error})
+            elif op in WRITES:
+                if op in ("add", "delete-min"):
+                    batch.append((queue, self._time(queue, time), op, value))
+                else:
+                    self._time(queue, time)
+                    batch.append((queue, time, "remove", None))
+                    if op == "edit":
+                        batch.append((queue, time, event_type, value))
+                acks.append((connection, rid))
+            else:
+                self._apply(batch, acks)
+                connection.reply(self._read(rid, op, queue, time))
+        self._apply(batch, acks)
+        for connection in touched:
+            connection.flush()
+
+    def _apply(self, batch, acks):
+        if batch:
+            self.manager.apply(batch)
+            batch.clear()
+        for connection, rid in acks:
+            connection.reply({"id": rid, "ok": True})
+        acks.clear()
+
+    def _read(self, rid, op, queue, time):
+        if op == "stats":
+            return {"id": rid, "ok": True, **self.manager.stats()}
+        if op == "at":
+            size, low, high, bridge = self.manager.query([(queue, time)])[0]
+            return {"id": rid, "ok": True, "time": time, "size": size, "min": low, "max": high, "bridge": bridge}
+        engine = self.manager.engine(queue)
+        time = self._time(queue, time)
+        engine.insert_event(time, "query")
+        return {"id": rid, "ok": True, "time": time, "max": engine.max_key(), "bridge": engine.is_bridge(time)}
+
+
+class Connection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.out = []
+        self.waiting = 0           # Requests submitted and not answered yet
+        self.write_paused = False
+        self.reading = True
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def data_received(self, data):
+        self.buffer += data
+        if b"\n" in data:
+            *lines, rest = self.buffer.split(b"\n")
+            self.buffer = bytearray(rest)
+            for line in lines:
+                if line.strip():
+                    self.server.submit(self, bytes(line))
+        if len(self.buffer) > MAX_LINE:
+            self.transport.write(b'{"id": null, "error": "line too long"}\n')
+            self.transport.close()
+        self._update_reading()
+
+    def reply(self, response):
+        self.waiting -= 1
+        if self.transport is not None:
+            self.out.append(json.dumps(response).encode() + b"\n")
+
+    def flush(self):
+        if self.out and self.transport is not None:
+            self.transport.write(b"".join(self.out))
+        self.out = []
+        self._update_reading()
+
+    def pause_writing(self):
+        self.write_paused = True
+        self._update_reading()
+
+    def resume_writing(self):
+        self.write_paused = False
+        self._update_reading()
+
+    def _update_reading(self):
+        if self.transport is None or self.transport.is_closing():
+            return
+        reading = not self.write_paused and self.waiting < MAX_PENDING
+        if reading != self.reading:
+            self.reading = reading
+            if reading:
+                self.transport.resume_reading()
+            else:
+                self.transport.pause_reading()
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, manager=None):
+    # The asyncio server (not started serving forever); path: a Unix socket
+    server = Server(manager)
+    loop = asyncio.get_running_loop()
+    if path is not None:
+        return await loop.create_unix_server(lambda: Connection(server), path)
+    return await loop.create_server(lambda: Connection(server), host, port)
+
+
+async def main(args):
+    server = await serve(args.host, args.port, args.unix, QueueManager(args.max_live))
+    where = args.unix or "%s:%d" % server.sockets[0].getsockname()[:2]
+    print(f"serving retroactive queues on {where}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve retroactive priority queues over a socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--max-live", type=int, default=64, help="queues kept as live engines")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
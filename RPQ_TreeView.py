@@ -0,0 +1,245 @@
+# Virtualized, level-of-detail drawing of the tree views on a Tk canvas
+# The layout (x from the in-order rank, y from the depth) is computed once per
+# structural change. Each redraw walks down from the root only into subtrees
+# that are on screen and wide enough to read, collapses the others into a
+# summary triangle, and moves or relabels the canvas items it already has
+# instead of deleting everything.
+
+LEVEL = 60             # World units between two depths
+TOP = 50               # World y of the root
+GAP = 6                # World units between neighbouring nodes
+MIN_SUBTREE_PX = 40    # Narrower subtrees are drawn as one glyph
+MIN_TEXT_ZOOM = 0.6    # Labels are hidden below this zoom
+MIN_ZOOM, MAX_ZOOM = 1e-4, 4.0
+
+
+class TreeView:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.style = None     # Node shape, size, colors and label(node), see RPQ_Vis.TREE_STYLES
+        self.root = None
+        self.version = None
+        self.layout = {}      # id(node) -> (x, first x, last x, depth, deepest depth below)
+        self.collapsed = {}   # id(node) -> nodes of a subtree laid out as one node (max_depth)
+        self.items = {}       # drawing key -> ((shape item, text item or None), spec)
+        self.zoom = 1.0
+        self.offset = (0.0, 0.0)  # World point at the top-left corner of the canvas
+        self.max_depth = None     # Deeper subtrees are collapsed (in the layout too) when set
+        self._drag = None
+        canvas.bind("<ButtonPress-1>", self._start_drag)
+        canvas.bind("<B1-Motion>", self._drag_to)
+        canvas.bind("<MouseWheel>", lambda e: self.zoom_at(e.x, e.y, 1.2 if e.delta > 0 else 1 / 1.2))
+        canvas.bind("<Button-4>", lambda e: self.zoom_at(e.x, e.y, 1.2))
+        canvas.bind("<Button-5>", lambda e: self.zoom_at(e.x, e.y, 1 / 1.2))
+        canvas.bind("<Double-Button-1>", lambda e: self.fit())
+        canvas.bind("<Configure>", lambda e: self.redraw())
+
+    def show(self, root, style, version, max_depth=None):
+        # version changes with every update of the engine; the layout is only
+        # recomputed then, a new style (tree view) also resets pan and zoom
+        new_style = style is not self.style
+        if new_style:
+            self.clear()
+            self.style = style
+        if new_style or version != self.version or root is not self.root or max_depth != self.max_depth:
+            self.root = root
+            self.version = version
+            self.max_depth = max_depth
+            self._layout()
+        if new_style:
+            self.fit()
+        else:
+            self.redraw()
+
+    def clear(self):
+        self.canvas.delete("tree")
+        self.items = {}
+
+    def _layout(self):
+        self.layout = {}
+        self.collapsed = {}
+        if self.root is None:
+            return
+        self.spacing = self.style["width"] + GAP
+        rank = [0]
+        def count(node):
+            return 1 + (count(node.left) if node.left else 0) + (count(node.right) if node.right else 0)
+        def place(node, depth):
+            if self.max_depth is not None and depth >= self.max_depth and (node.left or node.right):
+                # One slot for the whole subtree, drawn as its glyph
+                x = rank[0] * self.spacing
+                rank[0] += 1
+                self.collapsed[id(node)] = count(node)
+                self.layout[id(node)] = (x, x, x, depth, depth)
+                return x, x, depth
+            first = deepest = None
+            if node.left:
+                first, _, deepest = place(node.left, depth + 1)
+            x = rank[0] * self.spacing
+            rank[0] += 1
+            last = x
+            if node.right:
+                _, last, right_deepest = place(node.right, depth + 1)
+                deepest = right_deepest if deepest is None else max(deepest, right_deepest)
+            first = x if first is None else first
+            deepest = depth if deepest is None else deepest
+            self.layout[id(node)] = (x, first, last, depth, deepest)
+            return first, last, deepest
+        place(self.root, 0)
+
+    def _size(self):
+        width = int(self.canvas.winfo_width())
+        height = int(self.canvas.winfo_height())
+        return (width if width > 1 else 800), (height if height > 1 else 400)
+
+    def extent(self):
+        # Canvas size that shows the whole layout at zoom 1
+        if self.root is None:
+            return 0, 0
+        _, first, last, _, deepest = self.layout[id(self.root)]
+        bottom = max(self.style["height"] / 2, LEVEL / 2 if self.collapsed else 0)  # Glyphs reach LEVEL / 2 down
+        return last - first + self.spacing, TOP + deepest * LEVEL + bottom + GAP
+
+    def fit(self, whole=False):
+        # Whole width of the tree on screen (never enlarged), root at the top;
+        # whole: its whole depth too (images, where nothing can be panned)
+        if self.root is not None:
+            width, height = self._size()
+            _, first, last, _, _ = self.layout[id(self.root)]
+            span, tree_height = self.extent()
+            zoom = width / span
+            if whole:
+                zoom = min(zoom, (height - TOP) / (tree_height - TOP))
+            self.zoom = max(MIN_ZOOM, min(1.0, zoom))
+            self.offset = ((first + last) / 2 - width / 2 / self.zoom, TOP - TOP / self.zoom)
+        self.redraw()
+
+    def zoom_at(self, x, y, factor):
+        # Zoom around the canvas point (x, y)
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, self.zoom * factor))
+        wx, wy = self.offset[0] + x / self.zoom, self.offset[1] + y / self.zoom
+        self.zoom = zoom
+        self.offset = (wx - x / zoom, wy - y / zoom)
+        self.redraw()
+
+    def _start_drag(self, event):
+        self._drag = (event.x, event.y, self.offset)
+
+    def _drag_to(self, event):
+        if self._drag is None:
+            return
+        x, y, (ox, oy) = self._drag
+        self.offset = (ox - (event.x - x) / self.zoom, oy - (event.y - y) / self.zoom)
+        self.redraw()
+
+    def redraw(self):
+        if self.root is None or self.style is None:
+            self._sync({})
+            return
+        style, zoom, layout = self.style, self.zoom, self.layout
+        width, height = self._size()
+        ox, oy = self.offset
+        half_w, half_h = style["width"] / 2, style["height"] / 2
+        view_right, view_bottom = ox + width / zoom, oy + height / zoom
+        labels = zoom >= MIN_TEXT_ZOOM
+        def screen(x, depth):
+            return (x - ox) * zoom, (TOP + depth * LEVEL - oy) * zoom
+        wanted = {}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            x, first, last, depth, deepest = layout[id(node)]
+            # Skip subtrees entirely outside the viewport
+            if (last + half_w < ox or first - half_w > view_right
+                    or TOP + deepest * LEVEL + half_h < oy or TOP + depth * LEVEL - half_h > view_bottom):
+                continue
+            sx, sy = screen(x, depth)
+            children = [child for child in (node.left, node.right) if child is not None]
+            if children and ((last - first + self.spacing) * zoom < MIN_SUBTREE_PX
+                             or (self.max_depth is not None and depth >= self.max_depth)):
+                # Summary glyph: a triangle over the subtree, labelled with its size
+                left, _ = screen(first, depth)
+                right, _ = screen(last, depth)
+                count = self.collapsed.get(id(node)) or round((last - first) / self.spacing) + 1
+                wanted[("glyph", id(node))] = (
+                    "polygon", (sx, sy - half_h * zoom, left - half_w * zoom, sy + LEVEL * zoom / 2,
+                                right + half_w * zoom, sy + LEVEL * zoom / 2),
+                    (("fill", "lightgray"), ("outline", "gray")),
+                    str(count) if right - left > 30 or (labels and id(node) in self.collapsed) else None, (("fill", "black"),))
+                continue
+            for child in children:
+                cx, cy = screen(layout[id(child)][0], depth + 1)
+                wanted[("edge", id(node), id(child))] = ("line", (sx, sy, cx, cy), (("fill", "black"),), None, ())
+                stack.append(child)
+            wanted[("node", id(node))] = (
+                style["shape"], (sx - half_w * zoom, sy - half_h * zoom, sx + half_w * zoom, sy + half_h * zoom),
+                (("fill", style["fill"]),),
+                style["label"](node) if labels else None,
+                (("fill", style["text_fill"]),) + ((("font", style["font"]),) if style["font"] else ()))
+        self._sync(wanted)
+
+    def _sync(self, wanted):
+        # Diff against the items on the canvas: delete the ones no longer
+        # wanted, move/relabel the changed ones, create the new ones
+        canvas = self.canvas
+        for key in [key for key in self.items if key not in wanted]:
+            for item in self.items.pop(key)[0]:
+                if item is not None:
+                    canvas.delete(item)
+        created_edge = False
+        for key, spec in wanted.items():
+            old = self.items.get(key)
+            if old is not None and old[1] == spec:
+                continue
+            kind, coords, options, text, text_options = spec
+            if old is None or old[1][0] != kind:
+                if old is not None:
+                    for item in old[0]:
+                        if item is not None:
+                            canvas.delete(item)
+                create = {"oval": canvas.create_oval, "rect": canvas.create_rectangle,
+                          "polygon": canvas.create_polygon, "line": canvas.create_line}[kind]
+                tags = ("tree", "edge") if kind == "line" else ("tree",)
+                shape = create(*coords, tags=tags, **dict(options))
+                label = None
+                created_edge = created_edge or kind == "line"
+            else:
+                (shape, label), old_spec = old
+                if old_spec[1] != coords:
+                    canvas.coords(shape, *coords)
+                if old_spec[2] != options:
+                    canvas.itemconfig(shape, **dict(options))
+            label = self._sync_label(label, text, text_options, coords, kind)
+            self.items[key] = ((shape, label), spec)
+        if created_edge:
+            # New edges go under the nodes
+            canvas.tag_lower("edge")
+
+    def _sync_label(self, label, text, options, coords, kind):
+        canvas = self.canvas
+        if text is None:
+            if label is not None:
+                canvas.delete(label)
+            return None
+        if kind == "polygon":
+            x, y = coords[0], (coords[1] + coords[3]) / 2 + 4
+        else:
+            x, y = (coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2
+        if label is None:
+            return canvas.create_text(x, y, text=text, tags=("tree",), **dict(options))
+        canvas.coords(label, x, y)
+        canvas.itemconfig(label, text=text, **dict(options))
+        return label
+
+
+def collapse_depth(root, slots):
+    # Deepest max_depth whose layout is at most slots nodes wide: the nodes
+    # above it plus one slot per node at it. None if the whole tree fits.
+    level, depth, width = [root] if root is not None else [], 0, 0
+    while level:
+        width += len(level)
+        if width > slots:
+            return max(0, depth - 1)
+        level = [child for node in level for child in (node.left, node.right) if child is not None]
+        depth += 1
+    return None
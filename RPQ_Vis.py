@@ -1,166 +1,63 @@
-import tkinter as tk
-from tkinter import ttk
+import contextlib
+import functools
+import queue
 import random
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import math
-import re
-
-
-# AVL Tree (for retroactive PQ)
-
-class Node:
-    def __init__(self, key, timestamp):
-        self.key = key
-        self.timestamp = timestamp
-        self.left = None
-        self.right = None
-        self.height = 1  # Track the height for balancing
-
-class AVLTree:
-    def __init__(self):
-        self.root = None
-
-    def insert(self, key, timestamp):
-        self.root = self._insert(self.root, key, timestamp)
-
-    def _insert(self, node, key, timestamp):
-        if not node:
-            return Node(key, timestamp)
-        if key < node.key:
-            node.left = self._insert(node.left, key, timestamp)
-        else:
-            node.right = self._insert(node.right, key, timestamp)
-        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
-        return self._balance(node)
-
-    def delete(self, key):
-        self.root = self._delete(self.root, key)
-
-    def _delete(self, node, key):
-        if not node:
-            return node
-        if key < node.key:
-            node.left = self._delete(node.left, key)
-        elif key > node.key:
-            node.right = self._delete(node.right, key)
-        else:
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
-            temp = self._get_min_value_node(node.right)
-            node.key = temp.key
-            node.timestamp = temp.timestamp
-            node.right = self._delete(node.right, temp.key)
-        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
-        return self._balance(node)
-
-    def _get_min_value_node(self, node):
-        current = node
-        while current.left is not None:
-            current = current.left
-        return current
-
-    def _get_height(self, node):
-        return node.height if node else 0
-
-    def _get_balance(self, node):
-        return self._get_height(node.left) - self._get_height(node.right) if node else 0
-
-    def _rotate_left(self, z):
-        y = z.right
-        T2 = y.left
-        y.left = z
-        z.right = T2
-        z.height = 1 + max(self._get_height(z.left), self._get_height(z.right))
-        y.height = 1 + max(self._get_height(y.left), self._get_height(y.right))
-        return y
-
-    def _rotate_right(self, z):
-        y = z.left
-        T3 = y.right
-        y.right = z
-        z.left = T3
-        z.height = 1 + max(self._get_height(z.left), self._get_height(z.right))
-        y.height = 1 + max(self._get_height(y.left), self._get_height(y.right))
-        return y
-
-    def _balance(self, node):
-        balance = self._get_balance(node)
-        if balance > 1:
-            if self._get_balance(node.left) < 0:
-                node.left = self._rotate_left(node.left)
-            return self._rotate_right(node)
-        if balance < -1:
-            if self._get_balance(node.right) > 0:
-                node.right = self._rotate_right(node.right)
-            return self._rotate_left(node)
-        return node
-
-    def inorder_traversal(self, current, result):
-        if current:
-            self.inorder_traversal(current.left, result)
-            result.append((current.key, current.timestamp))
-            self.inorder_traversal(current.right, result)
-        return result
-
-
-# Augmented Tree Node (for Augmented BBST view)
-
-class AugTreeNode:
-    def __init__(self, event=None):
-        self.event = event  # (time_added, key, time_deleted)
-        self.left = None
-        self.right = None
-        self.aug = float('-inf')  # Augmented value
-
-
-# Update Tree Node (for the Updates BBST view)
-
-class UpdateNode:
-    def __init__(self, event=None):
-        self.event = event  # (timestamp, type, value)
-        self.left = None
-        self.right = None
-        self.val = 0      # Update value
-        self.sum = 0      # Subtree sum
+import sys
+import threading
+import time
+# The data structures live in the GUI-free RPQ_Core (names kept importable from here)
+from RPQ_Core import (AVLTree, AugTreeNode, UpdateNode, NO_AUG, RetroactiveEngine, ReplayCancelled, check_event,
+                      parse_commands, PROFILER)
+from RPQ_TreeView import TreeView
+
+# Tk and matplotlib are only loaded when the graphic mode is chosen
+tk = plt = FigureCanvasTkAgg = None
+np = MaxNLocator = Path = PathPatch = LineCollection = plot_columns = None
+
+
+def load_plot_modules():
+    # What update_plot needs, without Tk (also used for off-screen plots)
+    global np, MaxNLocator, Path, PathPatch, LineCollection, plot_columns
+    import numpy as np
+    from matplotlib.ticker import MaxNLocator
+    from matplotlib.path import Path
+    from matplotlib.patches import PathPatch
+    from matplotlib.collections import LineCollection
+    from RPQ_Batch import plot_columns
+
+
+def load_gui_modules():
+    global tk, plt, FigureCanvasTkAgg
+    load_plot_modules()
+    import tkinter as tk
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    import tkinter.filedialog
 
 
 # Retroactive Priority Queue & Visualization
 
-class RetroactivePriorityQueue:
+class RetroactivePriorityQueue(RetroactiveEngine):
     def __init__(self, root):
-        self.events = []         # (timestamp, type, value)
-        self.queue = []          # Active insertions: (timestamp, value)
-        # Plot data stored as (time_added, key, time_deleted)
-        self.plot_data = []
+        # events, queue, bst and plot_data are maintained by RetroactiveEngine
+        self.worker = None       # ReplayWorker in the graphic mode
+        self.scheduler = None    # RedrawScheduler in the graphic mode
+        self.event_log = None    # Listbox, one line per entry of self.events
+        RetroactiveEngine.__init__(self)
         self.query_lines = []    # (time, max_key, bridge_status)
         self.time = 0
         self.undo_stack = []
         self.redo_stack = []
-        self.bst = AVLTree()
         self.current_tree_view = "PQ"  # "PQ", "Augmented", "Updates"
+        # Node labels read deletion times from this engine's plot_data
+        self.tree_styles = {view: dict(style, label=functools.partial(style["label"], self))
+                            for view, style in TREE_STYLES.items()}
         if root is not None:
             self.__init_gui(root)
         self.update_display()
 
-    def get_update_value(self, event):
-        timestamp, etype, val = event
-        if etype == "add":
-            if (timestamp, val) in self.queue:
-                return 0
-            else:
-                return 1
-        elif etype == "delete-min":
-            return -1
-        else:
-            # For any other event type (like "query"), return 0.
-            return 0
-
-
     def __init_gui(self, root):
+        load_gui_modules()
         root.title("Retroactive Priority Queue Visualization")
         root.geometry("1200x800")
         self.top_frame = tk.Frame(root)
@@ -168,6 +65,7 @@ class RetroactivePriorityQueue:
         self.figure, self.ax = plt.subplots(figsize=(8, 3))
         self.canvas_plot = FigureCanvasTkAgg(self.figure, master=self.top_frame)
         self.canvas_plot.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.init_plot()
         self.content_frame = tk.Frame(root)
         self.content_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         self.left_frame = tk.Frame(self.content_frame)
@@ -185,10 +83,13 @@ class RetroactivePriorityQueue:
         tk.Button(button_frame, text="Undo", command=self.undo).grid(row=2, column=0, sticky="ew")
         tk.Button(button_frame, text="Redo", command=self.redo).grid(row=2, column=1, sticky="ew")
         tk.Button(button_frame, text="Quit", command=root.quit).grid(row=2, column=2, sticky="ew")
+        tk.Button(button_frame, text="Save Log", command=self.save_log).grid(row=3, column=0, sticky="ew")
+        tk.Button(button_frame, text="Load Log", command=self.load_log).grid(row=3, column=1, sticky="ew")
         self.tree_frame = tk.Frame(self.content_frame)
         self.tree_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         self.tree_canvas = tk.Canvas(self.tree_frame, width=800, height=400, bg="white")
         self.tree_canvas.pack(fill=tk.BOTH, expand=True)
+        self.tree_view = TreeView(self.tree_canvas)
         self.nav_frame = tk.Frame(root)
         self.nav_frame.pack(side=tk.TOP, fill=tk.X, pady=10)
         self.nav_buttons_frame = tk.Frame(self.nav_frame)
@@ -200,105 +101,107 @@ class RetroactivePriorityQueue:
         self.legend_frame.pack(side=tk.TOP, fill=tk.X)
         self.tree_legend_label = tk.Label(self.legend_frame, text="", font=("Helvetica", 10))
         self.tree_legend_label.pack(anchor="center")
-
-    def __init__(self, root):
-        self.events = []
-        self.queue = []
-        self.plot_data = []
-        self.query_lines = []
-        self.time = 0
-        self.undo_stack = []
-        self.redo_stack = []
-        self.bst = AVLTree()
-        self.current_tree_view = "PQ"
-        if root is not None:
-            self.__init_gui(root)
-        self.update_display()
+        self.busy_label = tk.Label(self.legend_frame, text="", fg="gray", font=("Helvetica", 10))
+        self.busy_label.pack(anchor="center")
+        self.scheduler = RedrawScheduler(root, self._redraw)
+        self.worker = ReplayWorker(root, self, self.scheduler.mark)
+        if PROFILER.enabled:
+            # Timings of the latest redraw (--profile)
+            self.status_label = tk.Label(root, text="", anchor="w", font=("Helvetica", 9))
+            self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
 
     def set_tree_view(self, view):
+        # Only the tree canvas and its legend change
         self.current_tree_view = view
-        self.draw_tree_view()
+        self.update_display(plot=False)
+
+    # Engine updates from the Tk thread first stop a background replay.
+    # The event log lists self.events line for line (the event's rank), so
+    # every path that changes the events (undo/redo, edit, load) keeps it in sync
+    def insert_event(self, timestamp, event_type, value=None, seq=None):
+        with self._engine_lock():
+            index = RetroactiveEngine.insert_event(self, timestamp, event_type, value, seq)
+        if self.event_log is not None:
+            self.event_log.insert(index, _log_line((timestamp, event_type, value)))
+        return index
+
+    def remove_event(self, index):
+        with self._engine_lock():
+            RetroactiveEngine.remove_event(self, index)
+        if self.event_log is not None:
+            self.event_log.delete(index)
 
-    def draw_tree_view(self):
-        self.tree_canvas.delete("all")
-        canvas_width = int(self.tree_canvas.winfo_width())
-        if canvas_width <= 1:
-            canvas_width = 800
-        x = canvas_width / 2
-        y = 50
-        x_offset = canvas_width / 4
-        y_offset = 60
-        if self.current_tree_view == "PQ":
-            if self.bst.root:
-                self._draw_bst(self.bst.root, x, y, x_offset, y_offset)
-            self.tree_legend_label.config(text="Legend: PQ Tree (AVL) – Blue nodes show key and T: time")
-        elif self.current_tree_view == "Augmented":
-            tree = self.build_augmented_tree()
-            if tree:
-                self._draw_aug_tree(tree, x, y, x_offset, y_offset, self.tree_canvas)
-            self.tree_legend_label.config(text="Legend: T = Time, K = Key, Del = Delete Time, Aug = Augmented Value")
-        elif self.current_tree_view == "Updates":
-            tree = self.build_update_tree()
-            if tree:
-                self._draw_update_tree(tree, x, y, x_offset, y_offset, self.tree_canvas)
-            self.tree_legend_label.config(text="Legend: T = Time, K = Key, Upd = Update Value, Sum = Subtree Sum")
+    def _load_keyed(self, keyed):
+        with self._engine_lock():
+            RetroactiveEngine._load_keyed(self, keyed)
+        if self.event_log is not None:
+            self.event_log.delete(0, tk.END)
+            self.event_log.insert(tk.END, *map(_log_line, self.events))
+
+    def _engine_lock(self):
+        return self.worker.lock() if self.worker is not None else contextlib.nullcontext()
 
+    @PROFILER.phase("tree")
+    def draw_tree_view(self):
+        # Laid out again only after an update; panning and zooming just redraw
+        root = self.tree_root(self.current_tree_view)
+        self.tree_view.show(root, self.tree_styles[self.current_tree_view], self.version)
+        self.tree_legend_label.config(text=TREE_LEGENDS[self.current_tree_view]
+                                      + "   (drag to pan, wheel to zoom, double-click to fit)")
+
+    def tree_root(self, view):
+        if view == "PQ":
+            return self.bst.root
+        if view == "Augmented":
+            return self.build_augmented_tree()
+        return self.build_update_tree()
+
+    @PROFILER.phase("save_state")
     def save_state(self):
-        if len(self.undo_stack) >= 5:
-            self.undo_stack.pop(0)
-        self.undo_stack.append((list(self.events), self.time, list(self.query_lines)))
+        # Each action is one history step: the engine journals the updates it
+        # applies, and undo/redo replay them (or their inverses) incrementally
+        self.journal = []
+        self.undo_stack.append((self.journal, self.time))
         self.redo_stack.clear()
 
     def undo(self):
         if not self.undo_stack:
             return
-        self.redo_stack.append((list(self.events), self.time, list(self.query_lines)))
-        self.events, self.time, self.query_lines = self.undo_stack.pop()
-        self.reevaluate_events()
+        entries, time = self.undo_stack.pop()
+        self.redo_stack.append((entries, self.time))
+        self.journal = None
+        for entry in reversed(entries):
+            self._apply_entry(entry, undo=True)
+        self.time = time
+        self.refresh()
 
     def redo(self):
         if not self.redo_stack:
             return
-        self.undo_stack.append((list(self.events), self.time, list(self.query_lines)))
-        self.events, self.time, self.query_lines = self.redo_stack.pop()
-        self.reevaluate_events()
-
-    def reevaluate_events(self):
-        # Ensure events are sorted by time
-        self.events = sorted(self.events, key=lambda x: x[0])
-        self.queue = []
-        self.plot_data = []
-        self.bst = AVLTree()
-        active_items = []
-        for timestamp, event_type, value in self.events:
-            if event_type == "add":
-                active_items.append((timestamp, value))
-                self.plot_data.append((timestamp, value, None))
-                self.bst.insert(value, timestamp)
-            elif event_type == "delete-min" and active_items:
-                active_items.sort(key=lambda x: x[1])
-                min_item = active_items.pop(0)
-                self.bst.delete(min_item[1])
-                for i, (t_added, key, t_deleted) in enumerate(self.plot_data):
-                    if key == min_item[1] and t_deleted is None:
-                        self.plot_data[i] = (t_added, key, timestamp)
-                        break
-        max_key = max([key for t_added, key, t_deleted in self.plot_data if t_deleted is None], default=0)
+        entries, time = self.redo_stack.pop()
+        self.undo_stack.append((entries, self.time))
+        self.journal = None
+        for entry in entries:
+            self._apply_entry(entry, undo=False)
+        self.time = time
+        self.refresh()
+
+    def _apply_entry(self, entry, undo):
+        if entry[0] == "query_line":
+            if undo:
+                self.query_lines.pop()
+            else:
+                self.query_lines.append(entry[1])
+        elif entry[0] == "query_lines":
+            self.query_lines = list(entry[1]) if undo else []
+        else:
+            self.apply_journal(entry, undo)
+
+    def refresh(self):
+        max_key = self.max_key()
         self.query_lines = [(time, max_key, self.is_bridge(time)) for time, _, _ in self.query_lines]
-        self.queue = active_items
         self.update_display()
 
-    def log_event(self, action, value=None, time=None):
-        if time is None:
-            time = self.time
-        if hasattr(self, 'event_log'):
-            if action == "add":
-                self.event_log.insert(tk.END, f"Time {time}: Add {value}")
-            elif action == "delete-min":
-                self.event_log.insert(tk.END, f"Time {time}: Delete Min")
-            elif action == "query":
-                self.event_log.insert(tk.END, f"Time {time}: Query")
-
     def insert_random(self):
         self.save_state()
         if not self.queue:
@@ -307,76 +210,83 @@ class RetroactivePriorityQueue:
             action = random.choice(["add", "delete-min", "query"])
         if action == "add":
             value = random.randint(1, 100)
-            self.events.append((self.time, "add", value))
-            self.log_event("add", value, time=self.time)
+            self.insert_event(self.time, "add", value)
         elif action == "delete-min":
-            self.events.append((self.time, "delete-min", None))
-            self.log_event("delete-min", time=self.time)
+            self.insert_event(self.time, "delete-min")
         elif action == "query":
             self.query()
             return
         self.time += 1
-        self.reevaluate_events()
+        self.refresh()
 
     def delete_min(self):
         if not self.queue:
             return
         self.save_state()
-        self.events.append((self.time, "delete-min", None))
-        self.log_event("delete-min", time=self.time)
+        self.insert_event(self.time, "delete-min")
         self.time += 1
-        self.reevaluate_events()
-
-    def is_bridge(self, query_time):
-        count = 0
-        for timestamp, event_type, _ in self.events:
-            if timestamp > query_time:
-                break
-            if event_type == "add":
-                count += 1
-            elif event_type == "delete-min":
-                count -= 1
-        return count == 0
+        self.refresh()
 
     def query(self):
         self.save_state()
-        max_key = max([key for t_added, key, t_deleted in self.plot_data if t_deleted is None], default=0)
+        max_key = self.max_key()
         is_bridge = self.is_bridge(self.time)
-        self.events.append((self.time, "query", None))
+        self.insert_event(self.time, "query")
         self.query_lines.append((self.time, max_key, is_bridge))
-        self.log_event("query", time=self.time)
+        self.journal.append(("query_line", self.query_lines[-1]))
         self.time += 1
-        self.update_plot()
+        self.update_display()
 
     def clear_all(self):
         self.save_state()
-        self.events = []
+        while self.events:
+            self.remove_event(len(self.events) - 1)
         self.time = 0
-        self.queue = []
-        self.plot_data = []
+        self.journal.append(("query_lines", self.query_lines))
         self.query_lines = []
-        self.bst = AVLTree()
-        if hasattr(self, 'event_log'):
-            self.event_log.delete(0, tk.END)
         self.update_display()
 
+    def save_log(self):
+        # Binary event log, or the text form for a .txt name (see RPQ_Log)
+        import RPQ_Log
+        path = tk.filedialog.asksaveasfilename(defaultextension=".rpqlog",
+                                               filetypes=[("Event log", "*.rpqlog"), ("Text", "*.txt")])
+        if path:
+            RPQ_Log.save(self.events, path)
+
+    def load_log(self):
+        import RPQ_Log
+        path = tk.filedialog.askopenfilename(filetypes=[("Event log", "*.rpqlog"), ("Text", "*.txt"), ("All files", "*")])
+        if not path:
+            return
+        self.journal = None
+        RPQ_Log.load(self, path)
+        # The old undo history refers to events that are gone
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.time = self.events[-1][0] + 1 if self.events else 0
+        self.query_lines = [(time, None, None) for time, event_type, _ in self.events if event_type == "query"]
+        self.refresh()
+
     def add_event(self):
         popup = tk.Toplevel(self.left_frame)
         popup.title("Add Insert Event")
         tk.Label(popup, text="Value to insert:").pack()
         event_value = tk.Entry(popup, width=20)
         event_value.pack()
+        error_label = tk.Label(popup, text="", fg="red")
         def save_event():
-            self.save_state()
             try:
-                value = int(event_value.get().strip())
-                self.events.append((self.time, "add", value))
-                self.log_event("add", value, time=self.time)
-            except ValueError:
-                pass
+                value = _key_value(event_value.get(), self.time)
+            except ValueError as exc:
+                error_label.config(text=str(exc))
+                error_label.pack()
+                return
+            self.save_state()
+            self.insert_event(self.time, "add", value)
             self.time += 1
             popup.destroy()
-            self.reevaluate_events()
+            self.refresh()
         tk.Button(popup, text="Save", command=save_event).pack()
 
     def edit_event(self):
@@ -392,178 +302,219 @@ class RetroactivePriorityQueue:
         popup = tk.Toplevel(self.left_frame)
         popup.title("Edit Event")
         tk.Label(popup, text="Event Type:").pack()
-        event_type_var = tk.StringVar(value=event_type)
+        # Remove is the retroactive Delete of the update
+        event_type_var = tk.StringVar(value="add" if event_type == "add" else "remove")
         def toggle_value_field():
             if event_type_var.get() != "add":
                 event_value.config(state=tk.DISABLED)
             else:
                 event_value.config(state=tk.NORMAL)
         tk.Radiobutton(popup, text="Add", variable=event_type_var, value="add", command=toggle_value_field).pack()
+        tk.Radiobutton(popup, text="Remove", variable=event_type_var, value="remove",
+                       command=toggle_value_field).pack()
         tk.Label(popup, text="Value (if add):").pack()
         event_value = tk.Entry(popup, width=20)
         if value is not None:
             event_value.insert(0, str(value))
         event_value.pack()
+        error_label = tk.Label(popup, text="", fg="red")
+        toggle_value_field()
         def save_edit():
-            self.save_state()
             e_type = event_type_var.get()
-            e_value = event_value.get().strip()
-            timestamp = self.events[index][0]
-            self.events.pop(index)
+            timestamp, seq = self.events.key(index)
             if e_type == "add":
                 try:
-                    new_value = int(e_value)
-                    self.events.insert(index, (timestamp, e_type, new_value))
-                except ValueError:
-                    pass
-            self.event_log.delete(index)
-            self.event_log.insert(index, f"Time {timestamp}: Add {e_value}")
+                    new_value = _key_value(event_value.get(), timestamp)
+                except ValueError as exc:
+                    error_label.config(text=str(exc))
+                    error_label.pack()
+                    return
+                if (event_type, value) == ("add", new_value):
+                    popup.destroy()
+                    return
+            self.save_state()
+            self.remove_event(index)
+            if e_type == "add":
+                # Same seq: the update keeps its place among those at its time
+                self.insert_event(timestamp, e_type, new_value, seq=seq)
             popup.destroy()
-            self.reevaluate_events()
+            self.refresh()
         tk.Button(popup, text="Save", command=save_edit).pack()
 
-    def update_display(self):
-        if hasattr(self, 'tree_canvas'):
-            self.tree_canvas.delete("all")
-            self.draw_tree_view()
-        if hasattr(self, 'canvas_plot'):
-            self.update_plot()
-
-    def _draw_bst(self, node, x, y, x_offset, y_offset):
-        if node.left:
-            self.tree_canvas.create_line(x, y, x - x_offset, y + y_offset, fill="black")
-            self._draw_bst(node.left, x - x_offset, y + y_offset, x_offset // 2, y_offset)
-        if node.right:
-            self.tree_canvas.create_line(x, y, x + x_offset, y + y_offset, fill="black")
-            self._draw_bst(node.right, x + x_offset, y + y_offset, x_offset // 2, y_offset)
-        self.tree_canvas.create_oval(x - 15, y - 15, x + 15, y + 15, fill="blue")
-        self.tree_canvas.create_text(x, y, text=f"{node.key}\nT:{node.timestamp}", fill="white")
-
+    def update_display(self, tree=True, plot=True):
+        # In the graphic mode this only marks the views dirty: a burst of
+        # edits is drawn in one frame by the RedrawScheduler
+        dirty = {view for view, flag in (("tree", tree), ("plot", plot)) if flag}
+        if self.scheduler is not None:
+            self.scheduler.mark(dirty)
+        else:
+            self._redraw(dirty)
+
+    def _redraw(self, dirty):
+        # Returns the views it could not draw yet
+        needs_plot_data = "plot" in dirty or ("tree" in dirty and self.current_tree_view == "Augmented")
+        if self.worker is not None:
+            if needs_plot_data and self.needs_replay():
+                # The O(n) history replay runs in the background, the
+                # scheduler is called again once plot_data is ready
+                self.busy_label.config(text="recomputing…")
+                self.worker.submit()
+                # The PQ and Updates trees do not need the replay, nor the
+                # lock that would cancel it: the replay only writes
+                # plot_data and the Augmented BBST leaves
+                if "tree" in dirty and self.current_tree_view != "Augmented":
+                    self.draw_tree_view()
+                    dirty = dirty - {"tree"}
+                return dirty
+            self.busy_label.config(text="")
+        with self._engine_lock():
+            if "tree" in dirty and hasattr(self, 'tree_canvas'):
+                self.draw_tree_view()
+            if "plot" in dirty and hasattr(self, 'canvas_plot'):
+                self.update_plot()
+        if hasattr(self, 'status_label'):
+            self.status_label.config(text=PROFILER.summary())
+        return set()
+
+    def init_plot(self):
+        # The key-time plot is a handful of reusable artists, grouped in
+        # layers; they are animated so the axes can be blitted
+        ax = self.ax
+        ax.set_title("Key-Time Relationship")
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Key")
+        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        empty = Path(np.empty((0, 2)))
+        self.plot_artists = {
+            # Deleted insertions: lifetime, deletion time, insertion point
+            "history": [ax.add_patch(PathPatch(empty, fill=False, edgecolor="black", linewidth=1.5)),
+                        ax.add_patch(PathPatch(empty, fill=False, edgecolor="red", linewidth=1.5)),
+                        ax.scatter([], [], s=36, c="black")],
+            # Insertions still in the queue, dashed up to the current time
+            "live": [ax.add_patch(PathPatch(empty, fill=False, edgecolor="green", linestyle="--", linewidth=1.5)),
+                     ax.scatter([], [], s=36, c="green")],
+            # Query lines, blue at a bridge
+            "queries": [ax.add_collection(LineCollection([], linewidths=1.5))],
+        }
+        for artists in self.plot_artists.values():
+            for artist in artists:
+                artist.set_animated(True)
+        self.plot_inputs = {}        # layer -> what its artists were last built from
+        self.plot_limits = None
+        self.plot_backgrounds = None  # (empty axes, axes with the history layer)
+        self.canvas_plot.mpl_connect("draw_event", self._on_plot_draw)
+
+    @PROFILER.phase("plot")
     def update_plot(self):
-        self.ax.clear()
-        self.ax.set_title("Key-Time Relationship")
-        self.ax.set_xlabel("Time")
-        self.ax.set_ylabel("Key")
-        self.ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-        self.ax.yaxis.set_major_locator(MaxNLocator(integer=True))
-        max_key_ever = max([key for t_added, key, t_deleted in self.plot_data], default=0)
-        for t_added, key, t_deleted in self.plot_data:
-            if t_deleted is not None:
-                self.ax.plot([t_added, t_deleted], [key, key], "k-")
-                self.ax.plot([t_deleted, t_deleted], [0, key], "r-")
-                self.ax.plot(t_added, key, "ko")
-            else:
-                self.ax.plot(t_added, key, "go")
-                self.ax.plot([t_added, self.time], [key, key], "g--")
-        for query_time, max_key, is_bridge in self.query_lines:
-            color = "b-" if is_bridge else "k-"
-            self.ax.plot([query_time, query_time], [0, max_key_ever], color)
-        self.canvas_plot.draw()
-
-    def _build_aug_tree(self, events, lo, hi):
-        if lo >= hi:
+        added, keys, deleted = plot_columns(self.plot_data)
+        done = np.isfinite(deleted)
+        max_key_ever = keys.max() if len(keys) else 0
+        limits = self._plot_limits(added, keys, deleted[done])
+        width = self.ax.bbox.width
+        inputs = {
+            "history": (self.plot_version, limits, width),
+            "live": (self.plot_version, self.time),
+            "queries": (tuple(self.query_lines), max_key_ever),
+        }
+        changed = [layer for layer in inputs if self.plot_inputs.get(layer) != inputs[layer]]
+        self.plot_inputs = inputs
+        if "history" in changed:
+            intervals, deletions, points = self.plot_artists["history"]
+            intervals.set_path(_segments(added[done], keys[done], deleted[done], keys[done]))
+            # Deletion lines all start at 0: only the longest per pixel column shows
+            t, k = _longest_per_column(deleted[done], keys[done], limits, width)
+            deletions.set_path(_segments(t, 0, t, k))
+            points.set_offsets(np.column_stack([added[done], keys[done]]))
+        if "live" in changed:
+            intervals, points = self.plot_artists["live"]
+            # Lines of the same key all end at the current time: draw their union
+            k, first = _first_per_key(keys[~done], added[~done])
+            intervals.set_path(_segments(first, k, self.time, k))
+            points.set_offsets(np.column_stack([added[~done], keys[~done]]))
+        if "queries" in changed:
+            lines = self.plot_artists["queries"][0]
+            lines.set_segments([[(t, 0), (t, max_key_ever)] for t, _, _ in self.query_lines])
+            lines.set_colors(["blue" if is_bridge else "black" for _, _, is_bridge in self.query_lines])
+        if limits != self.plot_limits or self.plot_backgrounds is None:
+            # The ticks move: full draw, _on_plot_draw puts the layers back
+            self.plot_limits = limits
+            if limits is not None:
+                self.ax.set_xlim(limits[0])
+                self.ax.set_ylim(limits[1])
+            self.canvas_plot.draw()
+        elif changed:
+            self._blit_layers("history" in changed)
+
+    def _plot_limits(self, added, keys, deleted):
+        # Like autoscaling, but x keeps some headroom so that adding events
+        # at the present does not move the axes (and force a full draw) each time
+        times = [self.time] + [t for t, _, _ in self.query_lines]
+        if not len(added) and len(times) == 1:
             return None
-        if hi - lo == 1:
-            node = AugTreeNode(event=events[lo])
-            t_added, key, t_deleted = events[lo]
-            node.aug = key if t_deleted is not None else float('-inf')
-            return node
-        mid = (lo + hi) // 2
-        left = self._build_aug_tree(events, lo, mid)
-        right = self._build_aug_tree(events, mid, hi)
-        node = AugTreeNode()
-        node.left = left
-        node.right = right
-        left_aug = left.aug if left else float('-inf')
-        right_aug = right.aug if right else float('-inf')
-        node.aug = max(left_aug, right_aug)
-        return node
-
-    def build_augmented_tree(self):
-        events = sorted(self.plot_data, key=lambda x: x[0])  # Sorted by time_added
-        return self._build_aug_tree(events, 0, len(events))
-
-    def _draw_aug_tree(self, node, x, y, x_offset, y_offset, canvas):
-        if node.left:
-            canvas.create_line(x, y, x - x_offset, y + y_offset)
-            self._draw_aug_tree(node.left, x - x_offset, y + y_offset, x_offset / 2, y_offset, canvas)
-        if node.right:
-            canvas.create_line(x, y, x + x_offset, y + y_offset)
-            self._draw_aug_tree(node.right, x + x_offset, y + y_offset, x_offset / 2, y_offset, canvas)
-        rect_width = 60
-        rect_height = 40
-        left_x = x - rect_width / 2
-        top_y = y - rect_height / 2
-        right_x = x + rect_width / 2
-        bottom_y = y + rect_height / 2
-        canvas.create_rectangle(left_x, top_y, right_x, bottom_y, fill="lightblue")
-        if node.event is not None:
-            t_added, key, t_deleted = node.event
-            text = f"T:{t_added} | K:{key}"
-            if t_deleted is not None:
-                text += f"\nDel:{t_deleted}"
-            else:
-                text += "\nDel:-"
+        x_lo = min(added.min(initial=times[0]), min(times))
+        x_hi = max(deleted.max(initial=times[0]), max(times))
+        y_lo = min(0, keys.min(initial=0))
+        y_hi = max(0, keys.max(initial=0))
+        y_pad = 0.05 * (y_hi - y_lo or 1)
+        y = (y_lo - y_pad, y_hi + y_pad)
+        if self.plot_limits is not None:
+            (old_lo, old_hi), old_y = self.plot_limits
+            if old_y == y and old_lo <= x_lo and x_hi <= old_hi and x_hi - x_lo > 0.5 * (old_hi - old_lo):
+                return self.plot_limits
+        span = x_hi - x_lo or 1
+        return (x_lo - 0.05 * span, x_hi + 0.15 * span), y
+
+    def _on_plot_draw(self, event):
+        # After a full draw (limits changed, window resized): save the
+        # background without the animated layers, then draw them on top.
+        # savefig to another format draws on a canvas of its own: not ours
+        if event.canvas is not self.canvas_plot:
+            return
+        self.plot_backgrounds = (self.canvas_plot.copy_from_bbox(self.ax.bbox), None)
+        self._blit_layers(True, blit=False)
+
+    def _blit_layers(self, history_changed, blit=True):
+        # Only the layers above an unchanged history are redrawn
+        canvas = self.canvas_plot
+        background, with_history = self.plot_backgrounds
+        if history_changed or with_history is None:
+            canvas.restore_region(background)
+            for artist in self.plot_artists["history"]:
+                self.ax.draw_artist(artist)
+            with_history = canvas.copy_from_bbox(self.ax.bbox)
+            self.plot_backgrounds = (background, with_history)
         else:
-            text = f"Aug:\n{node.aug if node.aug != float('-inf') else '-'}"
-        canvas.create_text(x, y, text=text, font=("Helvetica", 8))
-
-    def _build_update_tree(self, events, lo, hi):
-        if lo >= hi:
-            return None
-        if hi - lo == 1:
-            node = UpdateNode(event=events[lo])
-            node.val = self.get_update_value(events[lo])
-            node.sum = node.val
-            return node
-        mid = (lo + hi + 1) // 2  # Upper median to bias the split
-        left = self._build_update_tree(events, lo, mid)
-        right = self._build_update_tree(events, mid, hi)
-        node = UpdateNode()
-        node.left = left
-        node.right = right
-        node.sum = (left.sum if left else 0) + (right.sum if right else 0)
-        return node
-
-    def build_update_tree(self):
-        events = sorted(self.events, key=lambda x: x[0])
-        return self._build_update_tree(events, 0, len(events))
-
-    def _draw_update_tree(self, node, x, y, x_offset, y_offset, canvas):
-        if node.left:
-            canvas.create_line(x, y, x - x_offset, y + y_offset)
-            self._draw_update_tree(node.left, x - x_offset, y + y_offset, x_offset/2, y_offset, canvas)
-        if node.right:
-            canvas.create_line(x, y, x + x_offset, y + y_offset)
-            self._draw_update_tree(node.right, x + x_offset, y + y_offset, x_offset/2, y_offset, canvas)
-        rect_width = 60
-        rect_height = 40
-        left_x = x - rect_width/2
-        top_y = y - rect_height/2
-        right_x = x + rect_width/2
-        bottom_y = y + rect_height/2
-        canvas.create_rectangle(left_x, top_y, right_x, bottom_y, fill="lightgreen")
-        if node.event is not None:
-            timestamp, etype, val = node.event
-            update_val = node.val
-            if etype == "add":
-                text = f"Add\nK:{val} | T:{timestamp}\nUpd:{update_val}"
-            else:
-                text = f"Del | T:{timestamp}\nUpd:{update_val}"
+            canvas.restore_region(with_history)
+        for layer in ("live", "queries"):
+            for artist in self.plot_artists[layer]:
+                self.ax.draw_artist(artist)
+        if blit:
+            canvas.blit(self.ax.bbox)
+
+    def run_commands(self, input_str, verbose=False):
+        # The whole line is one batch: a single reevaluation, not one per command
+        commands, errors = parse_commands(input_str)
+        for time_str, action, reason in errors:
+            print(f"Invalid action at time {time_str}: {action} ({reason})")
+        if not commands:
+            return
+        self.time = max(self.time, max(cmd[0] for cmd in commands))
+        self.ingest(commands)
+        self.refresh()
+        if verbose:
+            for cmd_time, action, key in sorted(commands, key=lambda x: x[0]):
+                print(f"At time {cmd_time}: " + (f"insert {key}" if action == "add" else action) + " executed.")
+            print("Events:", self.events)
+            print("Active Queue:", self.queue)
+            print("Plot Data:", self.plot_data)
         else:
-            text = f"Sum:\n{node.sum}"
-        canvas.create_text(x, y, text=text, font=("Helvetica", 8))
-
-    def update_update_tree(self):
-        self.tree_canvas.delete("all")
-        root = self.build_update_tree()
-        if root:
-            canvas_width = int(self.tree_canvas.winfo_width())
-            if canvas_width <= 1:
-                canvas_width = 800
-            self._draw_update_tree(root, canvas_width/2, 50, canvas_width/4, 60, self.tree_canvas)
-
-    def prompt_mode(self):
+            print(f"{len(commands)} commands executed, {len(self.events)} events, {len(self.queue)} in queue.")
+        if PROFILER.enabled:
+            print(PROFILER.report())
+        print("------")
+
+    def prompt_mode(self, verbose=False):
         print("Running in prompt mode.")
         print("Enter commands in the following format examples (all on one line):")
         print('Insert(0, 1) = Will insert a key with value 1 at time 0')
@@ -576,69 +527,11 @@ class RetroactivePriorityQueue:
         print("Events: [(0, 'add', 1)] = [(time, action, key)]")
         print('Active Queue: [(0, 1)] = [(time, key)]')
         print('Plot Data: [(1, 0, None)] = [(key, time added, time deleted)]')
-        input_str = input("Enter commands: ")
-        pattern = re.compile(r'Insert\(([^,]+),([^)]+)\)')
-        commands = pattern.findall(input_str)
-        commands = sorted(commands, key=lambda x: int(x[0].strip()))
-        for time_str, action_str in commands:
-            cmd_time = int(time_str.strip())
-            # Update global time to be maximum so far
-            self.time = max(self.time, cmd_time)
-            action = action_str.strip().strip('"').strip("'")
-            if action.lower() == "delete-min":
-                # Remove any existing delete-min at this time (if needed)
-                self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="delete-min")]
-                self.events.append((cmd_time, "delete-min", None))
-                print(f"At time {cmd_time}: delete-min executed.")
-            elif action.lower() == "query":
-                self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="query")]
-                self.events.append((cmd_time, "query", None))
-                print(f"At time {cmd_time}: query executed.")
-            else:
-                try:
-                    key = int(action)
-                    # Remove any existing add event at this time so it is substituted
-                    self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="add")]
-                    self.events.append((cmd_time, "add", key))
-                    print(f"At time {cmd_time}: insert {key} executed.")
-                except ValueError:
-                    print(f"Invalid action at time {cmd_time}: {action}")
-            self.reevaluate_events()
-            print("Events:", self.events)
-            print("Active Queue:", self.queue)
-            print("Plot Data:", self.plot_data)
-            print("------")
+        self.run_commands(input("Enter commands: "), verbose)
         while True:
             more = input("Do you want to add more commands (y/n)? ")
             if more.lower().startswith("y"):
-                input_str = input("Enter additional commands: ")
-                commands = pattern.findall(input_str)
-                commands = sorted(commands, key=lambda x: int(x[0].strip()))
-                for time_str, action_str in commands:
-                    cmd_time = int(time_str.strip())
-                    self.time = max(self.time, cmd_time)
-                    action = action_str.strip().strip('"').strip("'")
-                    if action.lower() == "delete-min":
-                        self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="delete-min")]
-                        self.events.append((cmd_time, "delete-min", None))
-                        print(f"At time {cmd_time}: delete-min executed.")
-                    elif action.lower() == "query":
-                        self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="query")]
-                        self.events.append((cmd_time, "query", None))
-                        print(f"At time {cmd_time}: query executed.")
-                    else:
-                        try:
-                            key = int(action)
-                            self.events = [ev for ev in self.events if not (ev[0]==cmd_time and ev[1]=="add")]
-                            self.events.append((cmd_time, "add", key))
-                            print(f"At time {cmd_time}: insert {key} executed.")
-                        except ValueError:
-                            print(f"Invalid action at time {cmd_time}: {action}")
-                    self.reevaluate_events()
-                    print("Events:", self.events)
-                    print("Active Queue:", self.queue)
-                    print("Plot Data:", self.plot_data)
-                    print("------")
+                self.run_commands(input("Enter additional commands: "), verbose)
             else:
                 break
         if self.events and self.events[-1][1].lower() != "query":
@@ -649,12 +542,201 @@ class RetroactivePriorityQueue:
             print("Active Queue:", self.queue)
             print("Plot Data:", self.plot_data)
 
+class RedrawScheduler:
+    # Coalesces redraw requests: views are marked dirty separately and drawn
+    # together at most once per FRAME_MS, so holding down a button or
+    # replaying a script costs one frame per interval instead of one per event
+    FRAME_MS = 40
+
+    def __init__(self, root, redraw):
+        self.root = root
+        self.redraw = redraw      # redraw(dirty views) -> views left dirty
+        self.dirty = set()
+        self.pending = None
+        self.last = 0.0
+
+    def mark(self, views=()):
+        self.dirty.update(views)
+        if self.dirty and self.pending is None:
+            wait = self.FRAME_MS - (time.perf_counter() - self.last) * 1000
+            self.pending = self.root.after(max(0, int(wait)), self._frame)
+
+    def _frame(self):
+        self.pending = None
+        self.last = time.perf_counter()
+        dirty, self.dirty = self.dirty, set()
+        # Views waiting for the background replay stay dirty until it is done
+        self.dirty |= self.redraw(dirty)
+
+
+class ReplayWorker:
+    # Replays plot_data on a background thread so the Tk mainloop keeps
+    # running. The Tk thread takes lock() for every engine update, which
+    # first cancels a running replay (RetroactiveEngine.interrupt); the
+    # worker then retries the same generation once no lock() is pending,
+    # unless a newer submit replaced it. Results come back through a queue
+    # polled with after().
+    POLL_MS = 20
+
+    def __init__(self, root, engine, done):
+        self.root = root
+        self.engine = engine
+        self.done = done          # Called on the Tk thread when plot_data is ready
+        self.generation = 0       # Bumped by each submit; older results are stale
+        self._lock = threading.RLock()
+        self._cancel = threading.Event()
+        self._holders = 0         # lock() calls entered and not left yet
+        self._released = threading.Condition()
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        engine.interrupt = self._cancel.is_set
+        threading.Thread(target=self._run, daemon=True).start()
+        root.after(self.POLL_MS, self._poll)
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self._released:
+            self._holders += 1
+        self._cancel.set()
+        try:
+            with self._lock:
+                self._cancel.clear()
+                yield
+        finally:
+            with self._released:
+                self._holders -= 1
+                self._released.notify_all()
+
+    def submit(self):
+        self.generation += 1
+        self._requests.put(self.generation)
+
+    def _run(self):
+        while True:
+            generation = self._requests.get()
+            # Only the newest request matters
+            while not self._requests.empty():
+                generation = self._requests.get_nowait()
+            # Let the Tk thread through first instead of racing it for the lock
+            with self._released:
+                self._released.wait_for(lambda: not self._holders)
+            with self._lock:
+                if generation != self.generation:
+                    continue
+                try:
+                    self.engine.plot_data
+                except ReplayCancelled:
+                    self._requests.put(generation)
+                    continue
+            self._results.put(generation)
+
+    def _poll(self):
+        while not self._results.empty():
+            if self._results.get_nowait() == self.generation:
+                self.done()
+        self.root.after(self.POLL_MS, self._poll)
+
+
+# Key typed in the Add Insert / Edit Event pop-ups, ValueError if it is not one
+def _key_value(text, timestamp):
+    try:
+        value = int(text.strip())
+    except ValueError:
+        raise ValueError(f"not an integer: {text.strip()!r}") from None
+    check_event(timestamp, "add", value)
+    return value
+
+
+# Event log line for an entry of self.events
+def _log_line(event):
+    time, event_type, value = event
+    if event_type == "add":
+        return f"Time {time}: Add {value}"
+    return f"Time {time}: Delete Min" if event_type == "delete-min" else f"Time {time}: Query"
+
+
+# Tree views: node look and label(engine, node) (see RPQ_TreeView)
+
+def _aug_label(engine, node):
+    if node.left is not None:
+        return f"Aug:\n{node.aug if node.aug != NO_AUG else '-'}"
+    t_deleted = engine.deletion_time(node)
+    return f"T:{node.key[0]} | K:{node.prio[0]}\nDel:{'-' if t_deleted is None else t_deleted}"
+
+
+def _update_label(engine, node):
+    if node.left is not None:
+        return f"Sum:\n{node.sum}"
+    timestamp, etype, val = engine.update_event(node)
+    if etype == "add":
+        return f"Add\nK:{val} | T:{timestamp}\nUpd:{node.val}"
+    return f"Del | T:{timestamp}\nUpd:{node.val}"
+
+
+TREE_STYLES = {
+    "PQ": {"shape": "oval", "width": 30, "height": 30, "fill": "blue", "text_fill": "white", "font": None,
+           "label": lambda engine, node: f"{node.key}\nT:{node.timestamp}"},
+    "Augmented": {"shape": "rect", "width": 60, "height": 40, "fill": "lightblue", "text_fill": "black",
+                  "font": ("Helvetica", 8), "label": _aug_label},
+    "Updates": {"shape": "rect", "width": 60, "height": 40, "fill": "lightgreen", "text_fill": "black",
+                "font": ("Helvetica", 8), "label": _update_label},
+}
+TREE_LEGENDS = {
+    "PQ": "Legend: PQ Tree (AVL) – Blue nodes show key and T: time",
+    "Augmented": "Legend: T = Time, K = Key, Del = Delete Time, Aug = Augmented Value",
+    "Updates": "Legend: T = Time, K = Key, Upd = Update Value, Sum = Subtree Sum",
+}
+
+
+def _segments(x0, y0, x1, y1):
+    # One compound path of (x0, y0)-(x1, y1) segments: a single artist
+    # draws thousands of them
+    x0, y0, x1, y1 = np.broadcast_arrays(x0, y0, x1, y1)
+    vertices = np.empty((2 * len(x0), 2))
+    vertices[0::2, 0], vertices[0::2, 1] = x0, y0
+    vertices[1::2, 0], vertices[1::2, 1] = x1, y1
+    codes = np.tile(np.array([Path.MOVETO, Path.LINETO], dtype=Path.code_type), len(x0))
+    return Path(vertices, codes)
+
+
+def _longest_per_column(x, y, limits, width):
+    # For vertical lines from 0 to y: the one reaching furthest up (and
+    # down, for negative keys) in each pixel column of the axes
+    if limits is None or not len(x):
+        return x, y
+    (x_lo, x_hi), _ = limits
+    column = np.floor((x - x_lo) / (x_hi - x_lo) * width)
+    xs, ys = [], []
+    for part, sign in ((y >= 0, 1), (y < 0, -1)):
+        c, px, py = column[part], x[part], y[part]
+        if not len(c):
+            continue
+        order = np.lexsort((sign * py, c))
+        c = c[order]
+        last = np.append(c[1:] != c[:-1], True)
+        xs.append(px[order][last])
+        ys.append(py[order][last])
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def _first_per_key(keys, added):
+    # Distinct keys and the earliest insertion time of each
+    if not len(keys):
+        return keys, added
+    order = np.lexsort((added, keys))
+    keys, added = keys[order], added[order]
+    first = np.append(True, keys[1:] != keys[:-1])
+    return keys[first], added[first]
+
+
 if __name__ == "__main__":
+    PROFILER.enabled = "--profile" in sys.argv
     mode = input("Choose mode (g for graphic, p for prompt): ")
     if mode.lower().startswith("p"):
         rpq = RetroactivePriorityQueue(None)
-        rpq.prompt_mode()
+        rpq.prompt_mode(verbose="-v" in sys.argv)
     else:
+        load_gui_modules()
         root = tk.Tk()
         app = RetroactivePriorityQueue(root)
         root.mainloop()
@@ -0,0 +1,249 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from RPQ_Core import AVLTree, RetroactiveEngine
+
+# Benchmarks for the retroactive operations and views, with seeded workloads
+# (insert_random at scale). Results are JSON so two versions can be compared:
+#   python benchmark.py --out before.json
+#   python benchmark.py --out after.json --compare before.json
+
+# name -> (weights of add / delete-min / query, where retroactive updates land)
+WORKLOADS = {
+    "present-heavy": ({"add": 5, "delete-min": 3, "query": 2}, "present"),
+    "uniform-past": ({"add": 5, "delete-min": 3, "query": 2}, "uniform"),
+    "insert-heavy": ({"add": 8, "delete-min": 1, "query": 1}, "uniform"),
+    "delete-heavy": ({"add": 4, "delete-min": 5, "query": 1}, "present"),
+}
+
+
+class Workload:
+    def __init__(self, name, seed):
+        self.name = name
+        self.mix, self.times = WORKLOADS[name]
+        self.rng = random.Random(f"{seed}:{name}")
+        self.actions = list(self.mix)
+        self.weights = [self.mix[action] for action in self.actions]
+
+    def event(self, timestamp):
+        action = self.rng.choices(self.actions, self.weights)[0]
+        return (timestamp, action, self.rng.randint(1, 100) if action == "add" else None)
+
+    def history(self, n):
+        # Like pressing Add Random n times: one event per time step
+        return [self.event(t) for t in range(n)]
+
+    def retro_time(self, now):
+        if self.times == "present":
+            return max(0, now - int(self.rng.expovariate(1 / 10)))
+        return self.rng.randint(0, now)
+
+
+def summarize(samples_ns):
+    samples = sorted(samples_ns)
+    total = sum(samples)
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] / 1000
+    return {
+        "count": len(samples),
+        "p50_us": pct(50), "p90_us": pct(90), "p99_us": pct(99), "max_us": samples[-1] / 1000,
+        "ops_per_s": len(samples) / (total / 1e9) if total else None,
+    }
+
+
+def timed(fn, reps):
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def peak_memory(fn):
+    # Peak Python heap allocated by fn, in bytes
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_engine(workload, n, ops):
+    results = {}
+    history = workload.history(n)
+    engine = RetroactiveEngine()
+    results["load_events"] = summarize(timed(lambda: engine.load_events(history), 1))
+    now = n - 1
+
+    def insert():
+        t, action, value = workload.event(workload.retro_time(now))
+        start = time.perf_counter_ns()
+        engine.insert_event(t, action, value)
+        return time.perf_counter_ns() - start
+
+    def remove():
+        index = workload.rng.randrange(len(engine.events))
+        start = time.perf_counter_ns()
+        engine.remove_event(index)
+        return time.perf_counter_ns() - start
+
+    def query():
+        # What the Query button does: the bridge test plus the global max
+        t = workload.retro_time(now)
+        start = time.perf_counter_ns()
+        engine.is_bridge(t)
+        engine.max_key()
+        return time.perf_counter_ns() - start
+
+    def edit_then(view):
+        # A retroactive edit followed by a view: includes the lazy replay
+        engine.insert_event(*workload.event(workload.retro_time(now)))
+        start = time.perf_counter_ns()
+        view()
+        return time.perf_counter_ns() - start
+
+    results["insert_event"] = summarize([insert() for _ in range(ops)])
+    results["remove_event"] = summarize([remove() for _ in range(ops)])
+    results["is_bridge+max_key"] = summarize([query() for _ in range(ops)])
+    heavy = max(1, min(ops, 10 ** 6 // n))
+    results["build_augmented_tree"] = summarize([edit_then(engine.build_augmented_tree) for _ in range(heavy)])
+    results["build_update_tree"] = summarize([edit_then(engine.build_update_tree) for _ in range(heavy)])
+    results["reevaluate_events"] = summarize(timed(lambda: engine.load_events(engine.events), max(1, heavy // 10)))
+    results["peak_memory_bytes"] = peak_memory(lambda: RetroactiveEngine().load_events(history))
+    return results
+
+
+def bench_avl(workload, n, ops):
+    rng = workload.rng
+    tree = AVLTree()
+    items = [(rng.randint(1, 100), t) for t in range(n)]
+    for key, t in items:
+        tree.insert(key, t)
+    inserts = [(rng.randint(1, 100), n + i) for i in range(ops)]
+    deletes = rng.sample(items, min(ops, n))
+    return {
+        "AVLTree.insert": summarize(timed_each(tree.insert, inserts)),
+        "AVLTree.delete": summarize(timed_each(tree.delete, deletes)),
+    }
+
+
+def timed_each(fn, args):
+    samples = []
+    for arg in args:
+        start = time.perf_counter_ns()
+        fn(*arg)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def bench_plot(workload, n, reps):
+    # update_plot on an off-screen Agg canvas; needs matplotlib
+    try:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+    except ImportError:
+        return {"update_plot": "skipped (matplotlib not installed)"}
+    import RPQ_Vis
+    RPQ_Vis.load_plot_modules()
+    rpq = RPQ_Vis.RetroactivePriorityQueue(None)
+    rpq.load_events(workload.history(n))
+    rpq.time = n
+    rpq.figure = Figure(figsize=(8, 3))
+    rpq.ax = rpq.figure.add_subplot()
+    rpq.canvas_plot = FigureCanvasAgg(rpq.figure)
+    rpq.init_plot()
+    rpq.update_plot()
+
+    def edit():
+        # A retroactive edit: the history layer changes
+        rpq.insert_event(*workload.event(workload.retro_time(n - 1)))
+        start = time.perf_counter_ns()
+        rpq.update_plot()
+        return time.perf_counter_ns() - start
+
+    def query():
+        # A query line at the present: only the top layer changes
+        rpq.query_lines.append((n - 1, 0, False))
+        start = time.perf_counter_ns()
+        rpq.update_plot()
+        return time.perf_counter_ns() - start
+
+    return {"update_plot": summarize([edit() for _ in range(reps)]),
+            "update_plot (query)": summarize([query() for _ in range(reps)])}
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, cwd=sys.path[0] or ".").stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(sizes, workloads, seed, ops, plot_max):
+    report = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "ops": ops,
+        "results": [],
+    }
+    for name in workloads:
+        for n in sizes:
+            workload = Workload(name, seed)
+            results = bench_engine(workload, n, ops)
+            results.update(bench_avl(workload, n, ops))
+            if n <= plot_max:
+                results.update(bench_plot(workload, n, 10))
+            report["results"].append({"workload": name, "n": n, "metrics": results})
+            print(f"{name} n={n}: insert p50 {results['insert_event']['p50_us']:.1f} us, "
+                  f"reevaluate p50 {results['reevaluate_events']['p50_us'] / 1000:.1f} ms", file=sys.stderr)
+    return report
+
+
+def compare(report, baseline):
+    # p50 ratios new/old per (workload, n, operation); > 1 is slower
+    old = {(r["workload"], r["n"]): r["metrics"] for r in baseline["results"]}
+    for r in report["results"]:
+        before = old.get((r["workload"], r["n"]))
+        if before is None:
+            continue
+        for op, metric in r["metrics"].items():
+            if isinstance(metric, dict) and isinstance(before.get(op), dict) and before[op]["p50_us"]:
+                ratio = metric["p50_us"] / before[op]["p50_us"]
+                flag = "  <-- slower" if ratio > 1.2 else ""
+                print(f"{r['workload']:>14} n={r['n']:<8} {op:<22} {ratio:6.2f}x{flag}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the retroactive priority queue")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated history sizes, up to 1000000")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ops", type=int, default=1000, help="samples per operation")
+    parser.add_argument("--plot-max", type=int, default=100000, help="largest size for update_plot")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    args = parser.parse_args()
+    report = run([int(n) for n in args.sizes.split(",")], args.workloads.split(","),
+                 args.seed, args.ops, args.plot_max)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
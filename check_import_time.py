@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+# Import-time budget for the headless core: RPQ_Core (and RPQ_Vis outside of
+# the graphic mode) must load without Tk or matplotlib
+BUDGET_MS = 50
+GUI_MODULES = ("tkinter", "matplotlib")
+
+
+def measure_import(module):
+    code = f"import sys, {module}; print(' '.join(m for m in {GUI_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+    return cumulative_us / 1000, result.stdout.split()
+
+
+if __name__ == "__main__":
+    failed = False
+    for module in ("RPQ_Core", "RPQ_Vis"):
+        # Best of a few runs to smooth out a cold disk cache
+        runs = [measure_import(module) for _ in range(5)]
+        ms = min(run[0] for run in runs)
+        gui = runs[0][1]
+        print(f"{module}: {ms:.1f} ms (budget {BUDGET_MS} ms)" + (f", loaded {', '.join(gui)}" if gui else ""))
+        if ms > BUDGET_MS or gui:
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from benchmark import WORKLOADS, Workload, summarize
+
+# Load generator for RPQ_Server: throughput and latency of pipelined requests.
+#   python RPQ_Server.py &
+#   python loadgen.py --connections 4 --depth 64 --requests 20000
+# --serve runs a server in this process instead (one core for both sides).
+# Every connection keeps up to --depth requests in flight; the latency of a
+# request is from writing it to reading its response.
+
+
+def request_line(workload, rid, now, queue):
+    # Writes at retroactive times (add/delete-min), reads as time-travel queries
+    t, action, value = workload.event(workload.retro_time(now))
+    if action == "query":
+        request = {"id": rid, "op": "at", "time": t, "queue": queue}
+    elif action == "add":
+        request = {"id": rid, "op": "add", "time": t, "value": value, "queue": queue}
+    else:
+        request = {"id": rid, "op": "delete-min", "time": t, "queue": queue}
+    return json.dumps(request).encode() + b"\n"
+
+
+async def client(args, n, seed, latencies, errors):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    workload = Workload(args.workload, seed)
+    rng = random.Random(seed)
+    window = asyncio.Semaphore(args.depth)
+    sent = {}
+
+    async def receive():
+        for _ in range(n):
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter_ns() - sent.pop(response["id"]))
+            if "error" in response:
+                errors.append(response["error"])
+            window.release()
+
+    receiver = asyncio.create_task(receive())
+    for rid in range(n):
+        await window.acquire()
+        line = request_line(workload, rid, args.history + rid, f"q{rng.randrange(args.queues)}")
+        sent[rid] = time.perf_counter_ns()
+        writer.write(line)
+        if writer.transport.get_write_buffer_size() > 1 << 16:
+            await writer.drain()
+    await receiver
+    writer.close()
+    await writer.wait_closed()
+
+
+async def prefill(args):
+    # The same history in every queue, one pipelined batch per connection
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    workload = Workload(args.workload, args.seed)
+    for t, action, value in workload.history(args.history):
+        for q in range(args.queues):
+            request = {"op": action, "time": t, "queue": f"q{q}"}
+            if value is not None:
+                request["value"] = value
+            writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    for _ in range(args.history * args.queues):
+        await reader.readline()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    server = None
+    if args.serve:
+        import RPQ_Server
+        server = await RPQ_Server.serve(args.host, 0, args.unix)
+        if not args.unix:
+            args.port = server.sockets[0].getsockname()[1]
+    try:
+        if args.history:
+            await prefill(args)
+        latencies, errors = [], []
+        per_client = args.requests // args.connections
+        start = time.perf_counter()
+        await asyncio.gather(*(client(args, per_client, f"{args.seed}:{c}", latencies, errors)
+                               for c in range(args.connections)))
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    report = summarize(latencies)
+    # 1 / mean latency: not a throughput with requests in flight
+    del report["ops_per_s"]
+    report.update({"requests": len(latencies), "seconds": elapsed, "requests_per_s": len(latencies) / elapsed,
+                   "errors": len(errors), "connections": args.connections, "depth": args.depth,
+                   "workload": args.workload})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for RPQ_Server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--serve", action="store_true", help="run the server in this process")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=64, help="requests in flight per connection")
+    parser.add_argument("--requests", type=int, default=20000, help="total, over all connections")
+    parser.add_argument("--queues", type=int, default=8)
+    parser.add_argument("--history", type=int, default=1000, help="events per queue before measuring")
+    parser.add_argument("--workload", default="present-heavy", choices=list(WORKLOADS))
+    parser.add_argument("--seed", type=int, default=0)
+    report = asyncio.run(run(parser.parse_args()))
+    json.dump(report, sys.stdout, indent=1)
+    print()
@@ -0,0 +1,290 @@
+import heapq
+import random
+
+import pytest
+
+import RPQ_Core
+from RPQ_Core import NONE, AVLTree, EventStore, ReplayCancelled, RetroactiveEngine, parse_commands
+
+TIMES = range(-1, 22)  # Query times around the updates at 0..19
+
+
+def engine_with(events):
+    engine = RetroactiveEngine()
+    for event in events:
+        engine.insert_event(*event)
+    return engine
+
+
+def test_bridge_ignores_later_empty_delete_min():
+    # Q(-1) and Q(1) are empty: bridges, whatever comes after them
+    engine = engine_with([(0, "add", 1), (1, "delete-min"), (3, "query")])
+    assert engine.is_bridge(-1) and engine.is_bridge(1)
+    engine.insert_event(2, "delete-min")
+    assert engine.is_bridge(-1) and engine.is_bridge(1) and engine.is_bridge(2)
+    assert not engine.is_bridge(0)
+    assert engine.latest_bridge(0) is None
+    assert engine.latest_bridge(3) == 3
+    engine.insert_event(4, "add", 5)
+    engine.insert_event(5, "delete-min")
+    assert engine.is_bridge(5) and not engine.is_bridge(4)
+    assert engine.latest_bridge(4) == 3
+
+
+def test_evaluate_times_bridges_ignore_later_empty_delete_min():
+    engine = engine_with([(0, "add", 1), (1, "delete-min"), (2, "delete-min"), (3, "query"),
+                          (4, "add", 5), (5, "delete-min")])
+    times = list(range(-1, 7))
+    assert list(engine.evaluate_times(times)["bridge"]) == [engine.is_bridge(t) for t in times]
+    assert [engine.is_bridge(t) for t in times] == [True, False, True, True, True, False, True, True]
+
+
+# Differential tests: the engine against a replay of the whole history with
+# a heap after every retroactive update
+
+def heap_replay(history):
+    # history: (timestamp, seq, type, value) in key order -> (plot_data, Q_now)
+    heap, rows = [], {}
+    for timestamp, seq, event_type, value in history:
+        if event_type == "add":
+            heapq.heappush(heap, (value, timestamp, seq))
+            rows[(timestamp, seq)] = [timestamp, value, None]
+        elif event_type == "delete-min" and heap:
+            _, added, added_seq = heapq.heappop(heap)
+            rows[(added, added_seq)][2] = timestamp
+    plot_data = [tuple(rows[key]) for key in sorted(rows)]
+    return plot_data, sorted((timestamp, value) for value, timestamp, _ in heap)
+
+
+def alive(plot_data, t):
+    return [row for row in plot_data if row[0] <= t and (row[2] is None or t < row[2])]
+
+
+def random_edits(engine, rng, steps):
+    # Yields the history after each random insert_event/remove_event
+    history = []
+    seq = 0
+    for _ in range(steps):
+        if history and rng.random() < 0.3:
+            i = rng.randrange(len(history))
+            engine.remove_event(i)
+            history.pop(i)
+        else:
+            timestamp = rng.randrange(20)
+            event_type = rng.choice(("add", "add", "delete-min", "delete-min", "query"))
+            value = rng.randrange(10) if event_type == "add" else None
+            engine.insert_event(timestamp, event_type, value)
+            history.append((timestamp, seq, event_type, value))
+            history.sort(key=lambda event: event[:2])
+            seq += 1
+        yield history
+
+
+def check_engine(engine, history):
+    plot_data, queue = heap_replay(history)
+    assert list(engine.events) == [(t, event_type, value) for t, _, event_type, value in history]
+    assert list(engine.plot_data) == plot_data
+    assert engine.queue == queue
+    # Augmented BBST leaves: the insertions in order, deletion times included
+    leaves = []
+    stack = [engine.aug_tree.root] if engine.aug_tree.root else []
+    while stack:
+        node = stack.pop()
+        if node.left is None:
+            leaves.append(node)
+        else:
+            stack += [node.right, node.left]
+    assert [(leaf.key[0], leaf.prio[0], engine.deletion_time(leaf)) for leaf in leaves] == plot_data
+    latest = None
+    for t in TIMES:
+        items = alive(plot_data, t)
+        keys = [key for _, key, _ in items]
+        assert engine.size_at(t) == len(keys)
+        assert engine.min_at(t) == min(keys, default=None)
+        assert engine.max_at(t) == max(keys, default=None)
+        bridge = all(deleted is None for _, _, deleted in items)
+        assert engine.is_bridge(t) == bridge
+        # Latest bridge: reported at the latest update time that starts one
+        if bridge and any(event[0] == t for event in history):
+            latest = t
+        assert engine.latest_bridge(t) == (t if bridge else latest)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_updates_match_heap_replay(seed, monkeypatch):
+    # Small chunks and checkpoint strides: chunk splits and resumed replays
+    monkeypatch.setattr(EventStore, "CHUNK", 4)
+    engine = RetroactiveEngine(checkpoint_stride=4)
+    for history in random_edits(engine, random.Random(seed), 80):
+        check_engine(engine, history)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_timeline_index_survives_later_updates(seed, monkeypatch):
+    # Updates at time 15 keep the TimelineIndex for the times before it
+    monkeypatch.setattr(RPQ_Core, "SCAN_BUDGET", 0)
+    rng = random.Random(seed)
+    engine = RetroactiveEngine()
+    for history in random_edits(engine, rng, 60):
+        pass
+    check_engine(engine, history)
+    index = engine._timeline
+    for event in [(15, "add", rng.randrange(10)) for _ in range(5)] + [(15, "delete-min", None)] * 5:
+        engine.insert_event(*event)
+        history.append((event[0], len(history) + 100, *event[1:]))
+        history.sort(key=lambda event: event[:2])
+        plot_data = heap_replay(history)[0]
+        for t in range(-1, 15):
+            assert engine.min_at(t) == min((key for _, key, _ in alive(plot_data, t)), default=None)
+            assert engine.queue_at(t) == sorted(row[:2] for row in alive(plot_data, t))
+        assert engine._timeline is index
+    check_engine(engine, history)
+    assert engine._timeline is not index
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cancelled_replays_resume(seed, monkeypatch):
+    # Replays stopped part way (ReplayWorker cancelling one) between edits
+    monkeypatch.setattr(EventStore, "CHUNK", 4)
+    rng = random.Random(seed)
+    engine = RetroactiveEngine(checkpoint_stride=2)
+    for history in random_edits(engine, rng, 80):
+        polls = iter(range(rng.randrange(6)))
+        engine.interrupt = lambda: next(polls, None) is None
+        try:
+            engine.plot_data
+        except ReplayCancelled:
+            pass
+        engine.interrupt = None
+        check_engine(engine, history)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_load_events_matches_updates(seed):
+    engine = RetroactiveEngine()
+    for history in random_edits(engine, random.Random(seed), 60):
+        pass
+    loaded = RetroactiveEngine()
+    loaded.load_events(list(engine.events))
+    check_engine(loaded, history)
+    assert [loaded.is_bridge(t) for t in TIMES] == [engine.is_bridge(t) for t in TIMES]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_evaluate_times_matches_point_queries(seed):
+    pytest.importorskip("numpy")
+    engine = RetroactiveEngine()
+    for history in random_edits(engine, random.Random(seed), 60):
+        pass
+    columns = engine.evaluate_times(list(TIMES))
+    for i, t in enumerate(TIMES):
+        assert columns["size"][i] == engine.size_at(t)
+        for kind, expected in (("min", engine.min_at(t)), ("max", engine.max_at(t))):
+            value = columns[kind][i]
+            assert (None if value != value else value) == expected
+        assert columns["bridge"][i] == engine.is_bridge(t)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_journal_undo_restores_history(seed):
+    engine = RetroactiveEngine()
+    for history in random_edits(engine, random.Random(seed), 40):
+        pass
+    before = list(history)
+    engine.journal = []
+    for history in random_edits(engine, random.Random(seed + 100), 30):
+        pass
+    journal, engine.journal = engine.journal, None
+    for entry in reversed(journal):
+        engine.apply_journal(entry, undo=True)
+    check_engine(engine, before)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_ingest_paths_match_replace_event(seed):
+    # Small batches patch the trees (forced here by a journal), large ones
+    # merge and rebuild: both as replace_event in timestamp order
+    rng = random.Random(seed)
+    base = [(rng.randrange(10), rng.choice(("add", "delete-min", "query")), None) for _ in range(20)]
+    base = [(t, event_type, rng.randrange(10) if event_type == "add" else None) for t, event_type, _ in base]
+    batch = [(rng.randrange(12), "add", rng.randrange(10)) if rng.random() < 0.6
+             else (rng.randrange(12), rng.choice(("delete-min", "query")), None) for _ in range(15)]
+    expected = engine_with(base)
+    for event in sorted(batch, key=lambda event: event[0]):
+        expected.replace_event(*event)
+    for journal in ([], None):
+        engine = engine_with(base)
+        engine.journal = journal
+        assert engine.ingest(batch) == len({event[:2] for event in batch})
+        assert list(engine.events) == list(expected.events)
+        assert list(engine.plot_data) == list(expected.plot_data)
+        assert engine.queue == expected.queue
+
+
+def test_ingest_keeps_the_last_command_per_time_and_type():
+    engine = engine_with([(1, "add", 5), (1, "add", 6), (2, "delete-min"), (3, "query")])
+    assert engine.ingest([(1, "add", 7), (4, "add", 1), (1, "add", 8), (2, "delete-min", None), (4, "add", 2)]) == 3
+    assert list(engine.events) == [(1, "add", 8), (2, "delete-min", None), (3, "query", None), (4, "add", 2)]
+    assert engine.queue == [(4, 2)]
+
+
+@pytest.mark.parametrize("journal", [[], None])
+def test_insert_events_paths_match_insert_event(journal):
+    rng = random.Random(7)
+    base = [(rng.randrange(10), "add", rng.randrange(10)) for _ in range(10)] + [(5, "delete-min", None)] * 3
+    batch = [(rng.randrange(12), "add", rng.randrange(10)) for _ in range(8)] + [(3, "delete-min", None)] * 4
+    expected = engine_with(base + batch)
+    engine = engine_with(base)
+    engine.journal = journal
+    engine.insert_events(batch)
+    assert list(engine.events.keyed()) == list(expected.events.keyed())
+    assert list(engine.plot_data) == list(expected.plot_data)
+    assert engine.queue == expected.queue
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_avl_tree_rank_kth_and_delete(seed):
+    rng = random.Random(seed)
+    tree, items = AVLTree(), []
+    for step in range(300):
+        if items and rng.random() < 0.4:
+            if rng.random() < 0.5:
+                key, timestamp = items.pop(rng.randrange(len(items)))
+                tree.delete(key, timestamp)
+            else:
+                # Without a timestamp: the earliest node with that key
+                key = rng.choice(items)[0]
+                items.remove(min(item for item in items if item[0] == key))
+                tree.delete(key)
+        else:
+            item = (rng.randrange(20), step)
+            items.append(item)
+            tree.insert(*item)
+        items.sort()
+        assert len(tree) == len(items)
+        assert [(tree.kth(k).key, tree.kth(k).timestamp) for k in range(len(items))] == items
+        assert tree.kth(len(items)) is None
+        for key, timestamp in rng.sample(items, min(5, len(items))) + [(rng.randrange(20), -1)]:
+            assert tree.rank(key, timestamp) == sum(item < (key, timestamp) for item in items)
+    tree.delete(99, 0)  # Missing items are ignored
+    tree.delete(99)
+    assert len(tree) == len(items)
+
+
+@pytest.mark.parametrize("event", [(1, "add", 2 ** 63), (1, "add", NONE), (2 ** 64, "query", None),
+                                   (NONE, "delete-min", None), (1, "add", None), (1, "insert", 3)])
+def test_events_int64_columns_cannot_hold_are_rejected(event):
+    engine = engine_with([(0, "add", 1), (2, "delete-min")])
+    before = list(engine.events), list(engine.plot_data), list(engine.queue)
+    for update in (lambda: engine.insert_event(*event), lambda: engine.replace_event(*event),
+                   lambda: engine.ingest([(5, "add", 3), event]), lambda: engine.insert_events([(5, "add", 3), event]),
+                   lambda: engine.load_events([(5, "add", 3), event])):
+        with pytest.raises(ValueError):
+            update()
+        assert (list(engine.events), list(engine.plot_data), list(engine.queue)) == before
+
+
+def test_parse_commands_reports_out_of_range_values():
+    commands, errors = parse_commands('Insert(0, 1), Insert(1, 99999999999999999999), Insert(x, 2)')
+    assert commands == [(0, "add", 1)]
+    assert [error[:2] for error in errors] == [("1", "99999999999999999999"), ("x", "2")]
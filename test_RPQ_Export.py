@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+pytest.importorskip("matplotlib")
+import RPQ_Export
+
+
+def count(node):
+    return 0 if node is None else 1 + count(node.left) + count(node.right)
+
+
+@pytest.mark.parametrize("n", [20, 3000])
+def test_tree_images_are_drawn_at_a_readable_zoom(tmp_path, n):
+    rng = random.Random(n)
+    events = [(t, "add", rng.randrange(100)) if rng.random() < 0.6 else (t, "delete-min", None) for t in range(n)]
+    renderer = RPQ_Export.Renderer(width=400, height=300)
+    renderer.load(events)
+    for view in ("PQ", "Augmented", "Updates"):
+        renderer.save(view, str(tmp_path / f"{view}.png"))
+        tree = renderer.tree_view
+        assert tree.zoom == 1.0
+        assert 400 <= renderer.tree_canvas.width <= RPQ_Export.MAX_TREE_PX
+        assert tree.extent()[0] <= renderer.tree_canvas.width
+        # Every node is drawn, or counted in the glyph of its collapsed subtree
+        shown = len(tree.layout) - len(tree.collapsed) + sum(tree.collapsed.values())
+        assert shown == count(renderer.rpq.tree_root(view))
+        assert (tree.max_depth is not None) == (n > 20)
@@ -0,0 +1,63 @@
+import random
+import sys
+
+import pytest
+
+import RPQ_Log
+from RPQ_Core import RetroactiveEngine
+
+
+def history(seed, n=200):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(n):
+        event_type = rng.choice(("add", "delete-min", "query"))
+        events.append((rng.randrange(50), event_type, rng.randrange(-5, 100) if event_type == "add" else None))
+    return events
+
+
+def test_binary_log_round_trip(tmp_path):
+    engine = RetroactiveEngine()
+    for event in history(1):
+        engine.insert_event(*event)
+    path = str(tmp_path / "h.rpqlog")
+    RPQ_Log.save(engine.events, path)
+    with RPQ_Log.EventLog(path) as log:
+        assert [(event, seq) for event, seq in log.keyed()] == list(engine.events.keyed())
+    loaded = RetroactiveEngine()
+    RPQ_Log.load(loaded, path)
+    assert list(loaded.events) == list(engine.events)
+    assert loaded.queue == engine.queue
+    assert list(loaded.plot_data) == list(engine.plot_data)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_unsorted_log_is_read_in_key_order(tmp_path, monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        # Merge of sorted runs, several of them
+        monkeypatch.setitem(sys.modules, "numpy", None)
+        monkeypatch.setattr(RPQ_Log, "RUN", 16)
+    events = history(2)
+    path = str(tmp_path / "h.rpqlog")
+    with RPQ_Log.LogWriter(path) as writer:
+        for seq, (timestamp, event_type, value) in enumerate(events):
+            writer.append(timestamp, event_type, value, seq)
+    engine = RetroactiveEngine()
+    for event in events:
+        engine.insert_event(*event)
+    with RPQ_Log.EventLog(path) as log:
+        assert list(log) == events
+        assert list(log.keyed()) == list(engine.events.keyed())
+        replay = [(t, result) for t, event_type, _, result in log.replay()
+                  if event_type == "delete-min" and result is not None]
+    deleted = [(row[2], row[1]) for row in engine.plot_data if row[2] is not None]
+    assert sorted(replay) == sorted(deleted)
+
+
+def test_text_log_round_trip(tmp_path):
+    events = sorted(history(3), key=lambda event: event[0])
+    path = str(tmp_path / "h.txt")
+    RPQ_Log.save(events, path)
+    assert list(RPQ_Log.read_text(path)) == events
@@ -0,0 +1,34 @@
+import pytest
+
+from RPQ_Multi import QueueManager
+
+
+def test_query_of_unknown_queue_creates_nothing():
+    manager = QueueManager(max_live=1)
+    manager.apply([("a", 0, "add", 5), ("a", 1, "add", 2)])
+    assert manager.query([("typo", 3), ("a", 1)]) == [(0, None, None, True), (2, 2, 5, True)]
+    assert manager.queue_ids() == ["a"]
+    assert "a" in manager.live and not manager.parked.runs
+
+
+def test_single_live_queue_keeps_its_updates():
+    manager = QueueManager(max_live=1)
+    manager.apply([("a", 0, "add", 5), ("b", 0, "add", 1), ("a", 1, "add", 3), ("a", 0, "remove", None),
+                   ("a", 2, "add", 7)])
+    assert manager.events("a") == [(1, "add", 3), (2, "add", 7)]
+    assert manager.events("b") == [(0, "add", 1)]
+    with pytest.raises(ValueError):
+        QueueManager(max_live=0)
+
+
+def test_bad_update_leaves_queues_unchanged():
+    manager = QueueManager(max_live=1)
+    manager.apply([("a", 0, "add", 5), ("b", 0, "add", 1)])
+    with pytest.raises(ValueError):
+        manager.apply([("b", 1, "add", 2), ("a", 1, "add", 2 ** 63)])
+    assert manager.events("a") == [(0, "add", 5)] and manager.events("b") == [(0, "add", 1)]
+    # "a" is parked: a failed rebuild keeps it there
+    assert "a" in manager.parked
+    with pytest.raises(ValueError):
+        manager.engine("a", [(1, "add", 2 ** 63)])
+    assert manager.events("a") == [(0, "add", 5)]
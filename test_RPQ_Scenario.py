@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+import pytest
+
+import RPQ_Log
+from RPQ_Core import RetroactiveEngine
+from RPQ_Scenario import run_scenarios
+
+
+def history(rng, n=120):
+    events = []
+    for _ in range(n):
+        event_type = rng.choice(("add", "add", "delete-min", "query"))
+        events.append((rng.randrange(40), event_type, rng.randrange(50) if event_type == "add" else None))
+    return sorted(events, key=lambda event: event[0])
+
+
+def variant(rng, events):
+    edits = []
+    for _ in range(rng.randrange(4)):
+        t, event_type, _ = rng.choice(events)
+        action = rng.choice(("insert", "remove", "move"))
+        if action == "insert":
+            edits.append(("insert", rng.randrange(40), "add", rng.randrange(50)))
+        elif action == "remove":
+            edits.append(("remove", t, event_type))
+        else:
+            edits.append(("move", t, event_type, rng.randrange(40)))
+        events = apply(events, [edits[-1]])
+    return edits
+
+
+def apply(events, edits):
+    # The variant as a plain list of events, in insertion order
+    events = list(events)
+    for edit in edits:
+        if edit[0] == "insert":
+            events.append(edit[1:])
+        else:
+            old = min(i for i, event in enumerate(events) if event[:2] == edit[1:3])
+            _, event_type, value = events.pop(old)
+            if edit[0] == "move":
+                events.append((edit[3], event_type, value))
+    return events
+
+
+def expected(base, edits, queries):
+    before = RetroactiveEngine()
+    before.load_events(base)
+    after = RetroactiveEngine()
+    for event in sorted(apply(base, edits), key=lambda event: event[0]):
+        after.insert_event(*event)
+    old, new = Counter(before.plot_data), Counter(after.plot_data)
+    return {"queue": after.queue, "removed": sorted((old - new).elements(), key=str),
+            "added": sorted((new - old).elements(), key=str),
+            "queries": [(after.size_at(t), after.min_at(t), after.max_at(t), after.is_bridge(t)) for t in queries]}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_variants_match_direct_engines(workers):
+    rng = random.Random(workers)
+    base = history(rng)
+    variants = [variant(rng, base) for _ in range(12)] + [[]]
+    queries = sorted({event[0] for event in base if event[1] == "query"})
+    results = run_scenarios(base, variants, workers=workers)
+    assert len(results) == len(variants)
+    for edits, result in zip(variants, results):
+        want = expected(base, edits, queries)
+        assert result["queue"] == want["queue"]
+        assert sorted(result["removed"], key=str) == want["removed"]
+        assert sorted(result["added"], key=str) == want["added"]
+        assert result["queries"] == want["queries"]
+
+
+def test_text_log_base_and_explicit_queries(tmp_path):
+    rng = random.Random(3)
+    base = history(rng)
+    path = str(tmp_path / "base.txt")
+    RPQ_Log.write_text(path, base)
+    edits = [("insert", 0, "add", -1), ("insert", 39, "delete-min", None)]
+    [result] = run_scenarios(path, [edits], queries=[0, 20, 39], workers=1)
+    assert result["queries"] == expected(base, edits, [0, 20, 39])["queries"]
+
+
+def test_bad_edit_is_reported():
+    with pytest.raises(ValueError):
+        run_scenarios([(0, "add", 1)], [[("remove", 5, "add")]], workers=1)
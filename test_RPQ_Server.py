@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+
+from RPQ_Server import serve
+
+REQUESTS = [
+    {"id": 1, "op": "add", "value": 5},
+    {"id": 2, "op": "add", "value": 3},
+    {"id": 3, "op": "at", "time": 0},
+    {"id": 4, "op": "delete-min", "time": 1},
+    {"id": 5, "op": "query"},
+    "nope",
+    {"id": 7, "op": "add"},
+    {"id": 8, "op": "add", "queue": "b", "value": 1},
+    {"id": 9, "op": "at", "queue": "b", "time": 0},
+    {"id": 10, "op": "edit", "time": 0, "type": "add", "value": 9},
+    {"id": 11, "op": "remove", "time": 1},
+    {"id": 12, "op": "at", "time": 1},
+    {"id": 13, "op": "stats"},
+]
+
+
+async def exchange(where, tmp_path):
+    if where == "unix":
+        path = str(tmp_path / "rpq.sock")
+        server = await serve(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        server = await serve(port=0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+    async with server:
+        # Pipelined: every request in one write, before reading any response
+        writer.write(b"".join((r if isinstance(r, str) else json.dumps(r)).encode() + b"\n" for r in REQUESTS))
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in REQUESTS]
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+@pytest.mark.parametrize("where", ["tcp", "unix"])
+def test_pipelined_requests_are_answered_in_order(where, tmp_path):
+    responses = asyncio.run(exchange(where, tmp_path))
+    assert [response.get("id") for response in responses] == [1, 2, 3, 4, 5, None, 7, 8, 9, 10, 11, 12, 13]
+    by_id = {response["id"]: response for response in responses if response["id"] is not None}
+    for rid in (1, 2, 4, 8, 10, 11):
+        assert by_id[rid] == {"id": rid, "ok": True}
+    # A read sees every write before it, and none after it
+    assert by_id[3] == {"id": 3, "ok": True, "time": 0, "size": 1, "min": 5, "max": 5, "bridge": True}
+    assert by_id[5] == {"id": 5, "ok": True, "time": 2, "max": 5, "bridge": True}
+    assert "error" in responses[5] and "value must be an integer" in by_id[7]["error"]
+    assert by_id[9]["size"] == 1 and by_id[9]["min"] == 1
+    # The add at 0 became 9, the updates at 1 are gone
+    assert by_id[12] == {"id": 12, "ok": True, "time": 1, "size": 1, "min": 9, "max": 9, "bridge": True}
+    assert by_id[13]["ok"]